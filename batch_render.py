@@ -0,0 +1,259 @@
+# Headless batch renderer: turns a folder or glob of CSVs into charts in parallel.
+#
+#   python batch_render.py TestFiles --out charts
+#   python batch_render.py "TestFiles/test*.csv" --spec job.yaml --workers 4
+#
+# The job spec is a YAML mapping using the same names as the Streamlit controls, e.g.
+#
+#   title: GPU Scores
+#   sub_text: Higher scores indicate higher performance
+#   sort: score_gpu
+#   ascending: false
+#   size: [3840x2160, 1920x1080]
+#   colours: ['#f0991a', '#820000']
+#
+# Anything left out falls back to the presets in config.yaml and the page defaults.
+import argparse
+import glob
+import multiprocessing.context
+import os
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import yaml
+
+import startup
+
+config_file_path = 'config.yaml'
+
+# Same starting values as the sliders in chart_generator.py
+BAR_WIDTHS = {1: 0.5, 2: 0.4, 3: 0.2, 4: 0.1}
+
+
+def load_spec(file_path):
+    if file_path is None:
+        return {}
+    with open(file_path, 'r') as file:
+        return yaml.safe_load(file) or {}
+
+
+def find_csvs(sources):
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths.extend(sorted(glob.glob(os.path.join(source, "*.csv"))))
+        else:
+            paths.extend(sorted(glob.glob(source)))
+    # Keep the first occurrence when patterns overlap
+    return list(dict.fromkeys(paths))
+
+
+def chart_args(df, spec, config):
+    # Keyword arguments for chart.generate_chart (minus df/filename) from a job spec
+    import text_fit
+
+    default_cols = config['default_colours']
+    score_columns = [column for column in df.columns if column.startswith("score_")]
+    spec_colours = spec.get('colours', default_cols)
+
+    colours = {}
+    legend = {}
+    col_index = 0
+    for i, column in enumerate(df.columns):
+        if column.startswith("score_"):
+            colours["col"+str(i)] = spec_colours[col_index % len(spec_colours)]
+            legend["col"+str(i)] = spec.get('legend', {}).get(column, column.split("_")[1])
+            col_index = col_index + 1
+
+    sorted_col = spec.get('sort', "None")
+    if sorted_col != "None" and sorted_col not in df.columns:
+        raise ValueError(f"cannot sort by {sorted_col!r}, columns are {list(df.columns)}")
+
+    size = spec.get('size', config['resolutions'][0])
+
+    return {
+        'size': size,
+        'bg_color': spec.get('bg_colour', default_cols[4 % len(default_cols)]),
+        'sorted_col': sorted_col,
+        'is_ascending': spec.get('ascending', False),
+        'highlight': spec.get('highlight', "None"),
+        'colours': colours,
+        'highlight_color': spec.get('highlight_colour', default_cols[5 % len(default_cols)]),
+        'bar_width': spec.get('bar_width', BAR_WIDTHS.get(len(score_columns), 0.1)),
+        'bar_score_offset': spec.get('bar_score_offset', 110),
+        'title_font_size': spec.get('title_font_size', 30),
+        'subtitle_font_size': spec.get('subtitle_font_size', 15),
+        'axis_font_size': spec.get('axis_font_size', text_fit.axis_font_size(df, size)),
+        'legend_font_size': spec.get('legend_font_size', 25),
+        'bar_data_font_size': spec.get('bar_data_font_size', 15),
+        'title': spec.get('title', config['title_presets'][0]),
+        'x_title_pos': spec.get('x_title_pos', 0.0),
+        'y_title_pos': spec.get('y_title_pos', 1.05),
+        'sub_text': spec.get('sub_text', config['sub_title_presets'][0]),
+        'legend_text': legend,
+    }
+
+
+def build_jobs(csv_paths, spec, config, out_dir):
+    sizes = spec.get('size', config['resolutions'][0])
+    if isinstance(sizes, str):
+        sizes = [sizes]
+
+    jobs = []
+    for path in csv_paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        for size in sizes:
+            name = stem + ".png" if len(sizes) == 1 else stem + "_" + size + ".png"
+            jobs.append({
+                'csv': path,
+                'output': os.path.join(out_dir, name),
+                'spec': dict(spec, size=size),
+                'config': config,
+            })
+    return jobs
+
+
+def init_worker(colours=()):
+    import matplotlib
+    matplotlib.use("Agg")
+    # Every job in this worker then reuses the same colormaps and lookup tables
+    import palette
+    palette.registry.seed(colours)
+
+
+class _WorkerProcess(multiprocessing.context.SpawnProcess):
+    # A spawned worker that never imports the parent's __main__. Under Streamlit that is
+    # the page script, which every worker would otherwise run again (starting pools of
+    # its own). The jobs' functions live in importable modules, that is all a worker needs.
+    _main_lock = threading.Lock()
+
+    @staticmethod
+    def _Popen(process_obj):
+        # __main__ is only read while the child's start-up data is put together
+        with _WorkerProcess._main_lock:
+            main = sys.modules['__main__']
+            sys.modules['__main__'] = types.ModuleType("__main__")
+            try:
+                return multiprocessing.context.SpawnProcess._Popen(process_obj)
+            finally:
+                sys.modules['__main__'] = main
+
+
+class _WorkerContext(multiprocessing.context.SpawnContext):
+    Process = _WorkerProcess
+
+
+def worker_context():
+    # mp_context for pools started from the pages: spawn on every platform, as Windows
+    # always does, with workers that only import the modules their jobs need
+    return _WorkerContext()
+
+
+def job_colours(jobs):
+    colours = []
+    for job in jobs:
+        colours.extend(job['config'].get('default_colours', []))
+        colours.extend(job['spec'].get('colours', []))
+    return list(dict.fromkeys(colours))
+
+
+# One chart per worker process: jobs with the same size and layout swap their data into
+# the figure the previous job left instead of building a new one
+_worker_chart = None
+
+
+def render_worker_chart(df, params):
+    # Runs in a worker process, gives the PNG of df drawn with params on its chart
+    global _worker_chart
+    import chart
+
+    if _worker_chart is None:
+        _worker_chart = chart.Chart()
+    try:
+        return _worker_chart.update(df, **params).to_bytes()
+    except Exception:
+        # Don't carry a half-drawn figure into the next job
+        _worker_chart.close()
+        raise
+
+
+def render_job(job):
+    # Runs in a worker process
+    import pandas as pd
+
+    start = time.perf_counter()
+    df = pd.read_csv(job['csv'])
+    data = render_worker_chart(df, chart_args(df, job['spec'], job['config']))
+    with open(job['output'], "wb") as file:
+        file.write(data)
+    return {
+        'csv': job['csv'],
+        'output': job['output'],
+        'seconds': time.perf_counter() - start,
+        'bytes': len(data),
+    }
+
+
+def run_jobs(jobs, workers=None, report=print):
+    results = []
+    failures = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(job_colours(jobs),)) as executor:
+        futures = {executor.submit(render_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                result = future.result()
+            except Exception as error:
+                failures.append((job, error))
+                report(f"FAILED {job['csv']} -> {job['output']}: {error}")
+                continue
+            results.append(result)
+            report(f"{result['seconds']:7.2f}s  {result['bytes']/1e3:8.1f} kB  {result['csv']} -> {result['output']}")
+    elapsed = time.perf_counter() - start
+    return results, failures, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a folder or glob of CSVs into charts.")
+    parser.add_argument("sources", nargs="+", help="CSV files, folders or glob patterns")
+    parser.add_argument("--spec", help="YAML job spec (title, sort, size, colours, ...)")
+    parser.add_argument("--out", default="charts", help="output folder (default: charts)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--config", default=config_file_path, help="presets file (default: config.yaml)")
+    parser.add_argument("--title", help="override the spec title")
+    parser.add_argument("--sort", help="column to sort by")
+    parser.add_argument("--ascending", action="store_true", default=None, help="sort ascending")
+    parser.add_argument("--size", action="append", help="resolution, repeat for several")
+    parser.add_argument("--colours", nargs="+", help="bar colours in column order")
+    args = parser.parse_args(argv)
+
+    config = startup.load_config(args.config) or startup.DEFAULT_CONFIG
+    spec = load_spec(args.spec)
+    overrides = {'title': args.title, 'sort': args.sort, 'ascending': args.ascending,
+                 'size': args.size, 'colours': args.colours}
+    spec.update({key: value for key, value in overrides.items() if value is not None})
+
+    csv_paths = find_csvs(args.sources)
+    if not csv_paths:
+        print("No CSV files found", file=sys.stderr)
+        return 1
+
+    os.makedirs(args.out, exist_ok=True)
+    jobs = build_jobs(csv_paths, spec, config, args.out)
+    results, failures, elapsed = run_jobs(jobs, args.workers)
+
+    job_time = sum(result['seconds'] for result in results)
+    print(f"\n{len(results)} charts in {elapsed:.2f}s "
+          f"({len(results)/elapsed:.2f} charts/s, {job_time:.2f}s of render time)")
+    if failures:
+        print(f"{len(failures)} failed", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
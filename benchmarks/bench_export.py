@@ -0,0 +1,33 @@
+# File size and export time of every export.FORMATS entry at each resolution in
+# config.yaml, for a small and a large chart.
+# Run from the repo root: python benchmarks/bench_export.py
+import os
+import sys
+
+import matplotlib
+matplotlib.use("Agg")
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import batch_render
+import export
+import startup
+from synthetic import best_of, chart_df
+
+REPEATS = 3
+
+
+if __name__ == "__main__":
+    config = startup.load_config(os.path.join(ROOT, "config.yaml")) or startup.DEFAULT_CONFIG
+    datasets = {
+        "test3.csv": pd.read_csv(os.path.join(ROOT, "TestFiles", "test3.csv")),
+        "200 rows": chart_df(200, 3, subheading=False),
+    }
+    print(f"{'dataset':>10} {'size':>10} {'format':>16} {'kB':>8} {'ms':>7}")
+    for name, df in datasets.items():
+        for size in config['resolutions']:
+            args = batch_render.chart_args(df, {'size': size}, config)
+            for format in export.FORMATS:
+                seconds, data = best_of(lambda: export.export_chart(df, format=format, **args), REPEATS)
+                print(f"{name:>10} {size:>10} {format:>16} {len(data)/1e3:>8.1f} {seconds*1000:>7.0f}")
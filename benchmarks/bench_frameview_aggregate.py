@@ -0,0 +1,46 @@
+# FrameView aggregation over many runs: the original per-file groupby/concat loop from
+# pages/frameview_generator.py against frameview_data.aggregate_runs.
+# Run from the repo root: python benchmarks/bench_frameview_aggregate.py
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import frameview_data
+from synthetic import best_of, frameview_run
+
+RUNS = [10, 100, 300, 1000]
+ROWS_PER_RUN = 30
+# FrameView summaries carry plenty of columns the charts never use
+EXTRA_COLUMNS = 20
+
+
+def legacy_aggregate(frames):
+    final_df = pd.DataFrame()
+    for frame in frames:
+        min_fps = frame.groupby('Resolution')['1% FPS'].mean().round(1)
+        avg_fps = frame.groupby('Resolution')['Avg FPS'].mean().round(1)
+        pwr_agv = frame.groupby('Resolution')['PCAT Power (Watts)'].mean().round(1)
+        avg_fps_watt = round(avg_fps / pwr_agv, 2)
+
+        temp_df = pd.concat([min_fps, avg_fps, pwr_agv, avg_fps_watt], keys=['score_min_fps', 'score_avg_fps', 'score_pwr_agv', 'score_avg_fps_watt'], axis=1).reset_index()
+
+        temp_df = temp_df.assign(heading=frame['GPU0'])
+        final_df = pd.concat([final_df, temp_df])
+    return final_df
+
+
+if __name__ == "__main__":
+    print(f"{'runs':>6} {'legacy (s)':>11} {'vectorized (s)':>15} {'speedup':>8}")
+    for runs in RUNS:
+        frames = [frameview_run(seed, ROWS_PER_RUN, EXTRA_COLUMNS) for seed in range(runs)]
+        legacy_time, legacy = best_of(lambda: legacy_aggregate(frames))
+        vector_time, vector = best_of(lambda: frameview_data.aggregate_runs(frames))
+
+        scores = ['score_min_fps', 'score_avg_fps', 'score_pwr_agv', 'score_avg_fps_watt']
+        assert np.allclose(legacy[scores].to_numpy(dtype=float), vector[scores].to_numpy(dtype=float))
+        assert list(legacy['Resolution']) == list(vector['Resolution'])
+
+        print(f"{runs:>6} {legacy_time:>11.3f} {vector_time:>15.3f} {legacy_time/vector_time:>7.1f}x")
@@ -0,0 +1,90 @@
+# Peak memory and time of loading one large per-frame FrameView log three ways: a plain
+# pd.read_csv, the column-projected read_frameview, and chunked stream_summary.
+# Each method runs in its own process so the peak is its own.
+# Run from the repo root: python benchmarks/bench_frameview_stream.py [rows]
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    # Windows: no getrusage and no /proc, the peak is not recorded
+    resource = None
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import frameview_data
+
+ROWS = 2_000_000
+EXTRA_COLUMNS = 30
+METHODS = ["read_csv", "read_frameview", "stream_summary"]
+
+
+def write_log(path, rows):
+    rng = np.random.default_rng(0)
+    block = 250_000
+    for start in range(0, rows, block):
+        n = min(block, rows - start)
+        data = {
+            "Application": ["game.exe"] * n,
+            "Resolution": rng.choice(["1920x1080", "2560x1440", "3840x2160"], n),
+            "GPU0": ["NVIDIA GeForce RTX 4090"] * n,
+            "Avg FPS": rng.uniform(60, 200, n).round(2),
+            "1% FPS": rng.uniform(30, 100, n).round(2),
+            "PCAT Power (Watts)": rng.uniform(150, 400, n).round(2),
+        }
+        for i in range(EXTRA_COLUMNS):
+            data["Extra " + str(i)] = rng.uniform(0, 1, n).round(4)
+        pd.DataFrame(data).to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+
+
+def peak_rss_mb():
+    # VmHWM starts afresh on exec, ru_maxrss can carry over the parent's peak
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1e3
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def measure(method, path):
+    start = time.perf_counter()
+    if method == "read_csv":
+        df = pd.read_csv(path)
+        frameview_data.aggregate_runs([df])
+    elif method == "read_frameview":
+        df = frameview_data.read_frameview(path)
+        frameview_data.aggregate_runs([df])
+    else:
+        frameview_data.finish_runs([frameview_data.stream_summary(path, 0)], ["0"])
+    elapsed = time.perf_counter() - start
+    peak_mb = peak_rss_mb()
+    print(f"{elapsed} {peak_mb}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--measure":
+        measure(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "frameview.csv")
+        write_log(path, rows)
+        print(f"{rows} rows, {os.path.getsize(path)/1e6:.0f} MB on disk")
+        print(f"{'method':>16} {'time (s)':>9} {'peak RSS (MB)':>14}")
+        for method in METHODS:
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), "--measure", method, path],
+                                    capture_output=True, text=True, check=True).stdout.split()
+            peak = "n/a" if output[1] == "None" else f"{float(output[1]):.0f}"
+            print(f"{method:>16} {float(output[0]):>9.2f} {peak:>14}")
@@ -0,0 +1,130 @@
+# Render time of the per-bar vs compound gradient modes as the row count grows.
+# "gradients" is the extra cost of filling and drawing the gradients on a 4K chart.Chart
+# (the chart minus the same chart with flat bars, gradient_mode="vector"), "full chart"
+# is the whole render to PNG. Colours come from palette.registry, as in the pages.
+# The same comparison follows for the sample CSVs at every config.yaml resolution, full
+# size and live preview. Then the compound PNGs are compared with per_bar pixel by pixel,
+# with few bars (one image per bar) and many (shared images), including bar widths where
+# the bars of neighbouring rows overlap. The script fails if compound is slower than
+# per_bar anywhere or the pixels differ.
+# Run from the repo root: python benchmarks/bench_gradients.py
+import io
+import os
+import sys
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.image as mimage
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import batch_render
+import chart
+import startup
+from synthetic import chart_df, best_of
+
+ROWS = [10, 50, 100, 200, 400]
+SCORE_COLUMNS = 4
+SIZE = "3840x2160"
+REPEATS = 5
+DATASETS = ["test.csv", "test2.csv", "test3.csv"]
+# The sample charts render quickly, more rounds keep their timings steadier
+SAMPLE_REPEATS = 11
+# How much slower than per_bar compound may come out before it counts. Small charts
+# draw the same images in both modes, and their timings still vary by up to this much
+# from run to run on a busy machine.
+SLOWER_TOLERANCE = 0.2
+# Bar widths for the pixel check; 4 series at 0.3 or more overlap the next row
+CHECK_WIDTHS = [0.1, 0.25, 0.3, 0.5]
+# Rows for the pixel check, 20 rows of 4 series get an image per bar at CHECK_SIZE and
+# 60 rows shared images
+CHECK_ROWS = [20, 60]
+CHECK_SIZE = "1920x1080"
+# Share of pixels allowed to differ, and by how much a channel has to change to count
+MAX_DIFFERING = 0.001
+CHANNEL_TOLERANCE = 0.05
+
+
+def chart_params(df, config):
+    # The first row highlighted, so the highlight colour is part of the gradients
+    return batch_render.chart_args(df, {'size': SIZE, 'highlight': df['heading'][0], 'bar_width': 0.1,
+                                        'axis_font_size': 5, 'sub_text': ""}, config)
+
+
+def render(df, params, mode):
+    # Seconds to build and draw the chart, the images on its axes and the PNG
+    session = chart.Chart()
+    try:
+        start = time.perf_counter()
+        png = session.update(df, **dict(params, gradient_mode=mode)).to_bytes()
+        elapsed = time.perf_counter() - start
+        images = sum(isinstance(artist, mimage.AxesImage) for artist in session.ax.get_children())
+    finally:
+        session.close()
+    return elapsed, images, png
+
+
+def interleaved(function, modes, repeats=REPEATS):
+    # Fastest result of function(mode) for each mode over repeats rounds, the modes
+    # taking turns so a slow patch on the machine doesn't only hit one of them
+    results = {mode: [] for mode in modes}
+    for _ in range(repeats):
+        for mode in modes:
+            results[mode].append(function(mode))
+    return [min(results[mode]) for mode in modes]
+
+
+def slower(per_bar, compound):
+    return compound > per_bar * (1 + SLOWER_TOLERANCE)
+
+
+def differing(df, params):
+    # Share of pixels where the compound PNG differs from the per_bar one. Only pixels
+    # whose neighbours above and below differ too count, the lone rows of anti-aliasing
+    # where two bar edges meet come out slightly differently and aren't wrong colours.
+    per_bar, compound = (mimage.imread(io.BytesIO(render(df, params, mode)[2])) for mode in ("per_bar", "compound"))
+    differ = np.abs(per_bar - compound).max(axis=2) > CHANNEL_TOLERANCE
+    return (differ[1:-1] & differ[:-2] & differ[2:]).sum() / differ.size
+
+
+if __name__ == "__main__":
+    config = startup.load_config(os.path.join(ROOT, "config.yaml")) or startup.DEFAULT_CONFIG
+    print(f"{'':>13}{'gradients (s)':^40}{'full chart (s)':^26}")
+    print(f"{'rows':>6} {'bars':>6} {'per_bar':>9} {'images':>7} {'compound':>9} {'images':>7} "
+          f"{'per_bar':>12} {'compound':>12}")
+    failed = False
+    for rows in ROWS:
+        df = chart_df(rows, SCORE_COLUMNS, subheading=False)
+        params = chart_params(df, config)
+        (flat, _, _), (chart_per_bar, per_bar_images, _), (chart_compound, compound_images, _) = interleaved(
+            lambda mode: render(df, params, mode), ("vector", "per_bar", "compound"))
+        per_bar, compound = chart_per_bar - flat, chart_compound - flat
+        failed |= slower(chart_per_bar, chart_compound)
+        print(f"{rows:>6} {rows*SCORE_COLUMNS:>6} {per_bar:>9.3f} {per_bar_images:>7} {compound:>9.3f} {compound_images:>7} "
+              f"{chart_per_bar:>12.3f} {chart_compound:>12.3f}{'  SLOW' if slower(chart_per_bar, chart_compound) else ''}")
+
+    print(f"\n{'dataset':>10} {'size':>10} {'scale':>6} {'per_bar (s)':>12} {'compound (s)':>13}")
+    for name in DATASETS:
+        df = pd.read_csv(os.path.join(ROOT, "TestFiles", name))
+        for size in config['resolutions']:
+            args = batch_render.chart_args(df, {'size': size}, config)
+            for scale in (1.0, chart.preview_scale(size)):
+                per_bar, compound = interleaved(
+                    lambda mode: best_of(lambda: chart.generate_chart_bytes(df, scale=scale, gradient_mode=mode, **args), 1)[0],
+                    ("per_bar", "compound"), SAMPLE_REPEATS)
+                failed |= slower(per_bar, compound)
+                print(f"{name:>10} {size:>10} {scale:>6.2f} {per_bar:>12.3f} {compound:>13.3f}{'  SLOW' if slower(per_bar, compound) else ''}")
+
+    print(f"\n{'rows':>6} {'bar width':>10} {'differing pixels':>17}")
+    for rows in CHECK_ROWS:
+        df = chart_df(rows, SCORE_COLUMNS, subheading=False)
+        for bar_width in CHECK_WIDTHS:
+            share = differing(df, dict(chart_params(df, config), size=CHECK_SIZE, bar_width=bar_width))
+            failed |= share > MAX_DIFFERING
+            print(f"{rows:>6} {bar_width:>10} {share*100:>16.3f}%{'  FAIL' if share > MAX_DIFFERING else ''}")
+    if failed:
+        sys.exit(f"compound gradients slower than per_bar by more than {SLOWER_TOLERANCE*100:.0f}%, "
+                 f"or differing from it on more than {MAX_DIFFERING*100:.1f}% of pixels")
@@ -0,0 +1,55 @@
+# Time of one edit applied to a persistent chart.Chart against rebuilding the chart,
+# at preview and full scale.
+# Run from the repo root: python benchmarks/bench_incremental.py
+import io
+import os
+import sys
+
+import matplotlib
+matplotlib.use("Agg")
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import batch_render
+import chart
+import startup
+from synthetic import median_ms
+
+REPEATS = 5
+SIZE = "1920x1080"
+
+
+def edits(args):
+    first = list(args['colours'])[0]
+    return {
+        "title": {'title': args['title'] + " (edited)"},
+        "title position": {'x_title_pos': args['x_title_pos'] + 0.1},
+        "background": {'bg_color': "#202020"},
+        "series colour": {'colours': dict(args['colours'], **{first: "#00ff00"})},
+        "bar labels": {'bar_score_offset': args['bar_score_offset'] + 20},
+        "legend text": {'legend_text': {key: value + "*" for key, value in args['legend_text'].items()}},
+    }
+
+
+if __name__ == "__main__":
+    config = startup.load_config(os.path.join(ROOT, "config.yaml")) or startup.DEFAULT_CONFIG
+    df = pd.read_csv(os.path.join(ROOT, "TestFiles", "test3.csv"))
+    args = batch_render.chart_args(df, {'size': SIZE}, config)
+    print(f"{'edit':>15} {'scale':>6} {'rebuild (ms)':>13} {'update (ms)':>12}")
+    for name, edit in edits(args).items():
+        for scale in (chart.preview_scale(SIZE), 1.0):
+            base = dict(args, scale=scale)
+            edited = dict(base, **edit)
+
+            rebuild = median_ms(lambda: chart.generate_chart(df, io.BytesIO(), **edited), REPEATS)
+
+            session = chart.Chart()
+            session.update(df, **base)
+
+            def update():
+                # Toggle so every timed call is a real change
+                session.update(df, **(edited if session.params == base else base)).to_bytes()
+            update_ms = median_ms(update, REPEATS)
+            session.close()
+            print(f"{name:>15} {scale:>6.2f} {rebuild:>13.0f} {update_ms:>12.0f}")
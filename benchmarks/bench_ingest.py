@@ -0,0 +1,76 @@
+# Ingest time of many FrameView uploads with upload_cache.ingest_frameview at 1, 2, 4 ...
+# worker threads up to the core count. The parse cache is cleared before every run so
+# each one reads and summarizes every file. The last line loads the same files back
+# from a run_store.RunStore filled by a previous ingest.
+# Run from the repo root: python benchmarks/bench_ingest.py [files] [rows per file]
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import frameview_data
+import run_store
+import upload_cache
+from synthetic import frameview_run
+
+FILES = 32
+ROWS = 100_000
+EXTRA_COLUMNS = 20
+
+
+class Upload(io.BytesIO):
+    # The parts of Streamlit's UploadedFile the ingest uses
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+def make_upload(seed, rows):
+    # Rounded like FrameView's own CSVs
+    df = frameview_run(seed, rows, EXTRA_COLUMNS).round(2)
+    return Upload(f"run{seed}.csv", df.to_csv(index=False).encode())
+
+
+if __name__ == "__main__":
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else FILES
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else ROWS
+    uploads = [make_upload(seed, rows) for seed in range(files)]
+    print(f"{files} files of {rows} rows ({sum(upload.size for upload in uploads)/1e6:.0f} MB), {os.cpu_count()} cores")
+
+    workers = [1]
+    while workers[-1]*2 <= os.cpu_count():
+        workers.append(workers[-1]*2)
+
+    print(f"{'workers':>8} {'ingest (s)':>11} {'speedup':>8}")
+    expected = None
+    serial = None
+    for count in workers:
+        upload_cache.parsed = upload_cache.TTLCache(max_entries=2*files)
+        upload_cache.summaries = upload_cache.TTLCache(max_entries=2*files)
+        start = time.perf_counter()
+        results = upload_cache.ingest_frameview(uploads, large_bytes=float("inf"), workers=count)
+        elapsed = time.perf_counter() - start
+        serial = serial or elapsed
+
+        table = frameview_data.finish_runs([result['summary'] for result in results], [result['name'] for result in results])
+        if expected is None:
+            expected = table
+        elif not table.equals(expected):
+            print(f"{count} workers: different table from 1 worker")
+        print(f"{count:>8} {elapsed:>11.2f} {serial/elapsed:>7.2f}x")
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = run_store.RunStore(directory)
+        upload_cache.ingest_frameview(uploads, large_bytes=float("inf"), store=store)
+        upload_cache.parsed = upload_cache.TTLCache(max_entries=2*files)
+        upload_cache.summaries = upload_cache.TTLCache(max_entries=2*files)
+        start = time.perf_counter()
+        results = upload_cache.ingest_frameview(uploads, large_bytes=float("inf"), store=store)
+        elapsed = time.perf_counter() - start
+        table = frameview_data.finish_runs([result['summary'] for result in results], [result['name'] for result in results])
+        if not table.equals(expected):
+            print("stored: different table from parsing")
+        print(f"{'stored':>8} {elapsed:>11.2f} {serial/elapsed:>7.2f}x")
@@ -0,0 +1,60 @@
+# Layout stage of chart.Chart at growing row counts: sorting, the bar layout arrays, the
+# bars, the gradient and highlight styling and the ticks, timed without drawing, then a
+# highlight change on the built chart. Times per bar should stay flat as rows grow.
+# Run from the repo root: python benchmarks/bench_layout.py [rows ...]
+import os
+import sys
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import batch_render
+import chart
+import profiling
+import startup
+from synthetic import chart_df
+
+ROWS = [500, 2000, 8000]
+SERIES = 3
+REPEATS = 3
+STAGES = ["sort", "layout", "barh", "gradient", "ticks"]
+
+
+def chart_params(df, config):
+    # Sorted by the first series with a row in the middle highlighted. The axis font is
+    # fixed rather than fitted, measuring thousands of labels isn't what is timed here.
+    return batch_render.chart_args(df, {'size': "1920x1080", 'sort': "score_1", 'highlight': df['heading'].iloc[len(df)//2],
+                                        'bar_width': 0.25, 'axis_font_size': 12, 'sub_text': ""}, config)
+
+
+def layout_stages(df, params):
+    # Median of every stage over REPEATS builds, and of a highlight change afterwards
+    runs, highlights = [], []
+    for _ in range(REPEATS):
+        session = chart.Chart()
+        timer = profiling.StageTimer()
+        with profiling.recording(timer):
+            session.update(df, **params)
+        runs.append(timer.stages)
+        start = time.perf_counter()
+        session.update(df, **dict(params, highlight=df['heading'].iloc[0]))
+        highlights.append(time.perf_counter() - start)
+        session.close()
+    stages = {name: sorted(run.get(name, 0.0) for run in runs)[len(runs)//2] for name in STAGES}
+    return stages, sorted(highlights)[len(highlights)//2]
+
+
+if __name__ == "__main__":
+    rows_list = [int(rows) for rows in sys.argv[1:]] or ROWS
+    config = startup.load_config(os.path.join(ROOT, "config.yaml")) or startup.DEFAULT_CONFIG
+    print(f"{SERIES} series, times in ms (us per bar)")
+    print(f"{'rows':>6} " + " ".join(f"{name:>16}" for name in STAGES + ["highlight"]))
+    for rows in rows_list:
+        df = chart_df(rows, SERIES, subheading=False)
+        stages, highlight = layout_stages(df, chart_params(df, config))
+        bars = rows * SERIES
+        cells = [f"{seconds*1000:7.1f} ({seconds*1e6/bars:5.2f})" for seconds in list(stages.values()) + [highlight]]
+        print(f"{rows:>6} " + " ".join(f"{cell:>16}" for cell in cells))
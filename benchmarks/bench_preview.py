@@ -0,0 +1,36 @@
+# Live preview latency against chart.PREVIEW_TARGET_MS, next to the full render, for
+# every resolution in config.yaml.
+# Run from the repo root: python benchmarks/bench_preview.py
+import os
+import sys
+
+import matplotlib
+matplotlib.use("Agg")
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import batch_render
+import chart
+import startup
+from synthetic import median_ms
+
+REPEATS = 5
+DATASETS = ["test.csv", "test2.csv", "test3.csv"]
+
+
+if __name__ == "__main__":
+    config = startup.load_config(os.path.join(ROOT, "config.yaml")) or startup.DEFAULT_CONFIG
+    print(f"target {chart.PREVIEW_TARGET_MS} ms at ~{chart.PREVIEW_WIDTH} px wide")
+    print(f"{'dataset':>10} {'size':>10} {'preview (ms)':>13} {'full (ms)':>10} {'':>5}")
+    misses = 0
+    for name in DATASETS:
+        df = pd.read_csv(os.path.join(ROOT, "TestFiles", name))
+        for size in config['resolutions']:
+            args = batch_render.chart_args(df, {'size': size}, config)
+            preview = median_ms(lambda: chart.generate_chart_bytes(df, scale=chart.preview_scale(size), **args), REPEATS)
+            full = median_ms(lambda: chart.generate_chart_bytes(df, **args), REPEATS)
+            ok = preview <= chart.PREVIEW_TARGET_MS
+            misses += not ok
+            print(f"{name:>10} {size:>10} {preview:>13.0f} {full:>10.0f} {'ok' if ok else 'SLOW':>5}")
+    sys.exit(1 if misses else 0)
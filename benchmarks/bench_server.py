@@ -0,0 +1,110 @@
+# Load test of render_server.py: requests per second and latency at every resolution in
+# config.yaml. Starts the server with the render cache off, so every request renders,
+# then keeps a fixed number of keep-alive connections busy posting CSVs. Every request
+# gets different data (synthetic.chart_df with its own seed): a worker's reused chart
+# would otherwise find nothing changed after the first request and only run savefig.
+# Run from the repo root: python benchmarks/bench_server.py [requests per size] [connections]
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import startup
+from synthetic import chart_df
+
+PORT = 8791
+REQUESTS = 40
+# Shaped like TestFiles/test.csv
+ROWS = 7
+SCORE_COLUMNS = 2
+
+
+async def request(reader, writer, method, target, body=b"", content_type="text/csv"):
+    writer.write((f"{method} {target} HTTP/1.1\r\nHost: localhost\r\nContent-Type: {content_type}\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode().partition(":")
+        headers[name.strip().lower()] = value.strip()
+    payload = await reader.readexactly(int(headers["content-length"]))
+    return status, payload
+
+
+async def wait_until_up(timeout=60):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+            status, payload = await request(reader, writer, "GET", "/health")
+            writer.close()
+            return json.loads(payload)
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+def csv_bodies(count, first_seed=0):
+    # One CSV per request, built before the clock starts
+    return [chart_df(ROWS, SCORE_COLUMNS, seed=seed).to_csv(index=False).encode()
+            for seed in range(first_seed, first_seed + count)]
+
+
+async def load(size, bodies, connections):
+    # Posts every body once, returns the wall time and every request's latency
+    latencies = []
+    remaining = list(reversed(bodies))
+
+    async def client():
+        reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+        while remaining:
+            body = remaining.pop()
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, "POST", f"/render?size={size}", body)
+            if status != 200:
+                raise RuntimeError(f"{size}: HTTP {status}")
+            latencies.append(time.perf_counter() - start)
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(connections)))
+    return time.perf_counter() - start, sorted(latencies)
+
+
+async def run(requests, connections):
+    health = await wait_until_up()
+    print(f"{health['workers']} workers, {connections} connections, {requests} requests per size, "
+          f"{ROWS} rows x {SCORE_COLUMNS} scores, new data every request")
+
+    # The first request after start-up, on a worker that has only done the warm-up render
+    resolutions = (startup.load_config(os.path.join(ROOT, "config.yaml")) or startup.DEFAULT_CONFIG)['resolutions']
+    first, _ = await load(resolutions[0], csv_bodies(1), 1)
+    print(f"first request {first*1000:.0f} ms")
+
+    print(f"{'size':>10} {'req/s':>7} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for i, size in enumerate(resolutions):
+        elapsed, latencies = await load(size, csv_bodies(requests, 1 + i*requests), connections)
+        p50 = latencies[len(latencies)//2]
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies)*0.95))]
+        print(f"{size:>10} {requests/elapsed:>7.2f} {p50*1000:>9.0f} {p95*1000:>9.0f}")
+
+
+if __name__ == "__main__":
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else REQUESTS
+    connections = int(sys.argv[2]) if len(sys.argv) > 2 else 2*(os.cpu_count() or 1)
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "render_server.py"), "--port", str(PORT), "--no-cache"],
+                              stdout=subprocess.DEVNULL)
+    try:
+        asyncio.run(run(requests, connections))
+    finally:
+        server.terminate()
+        server.wait()
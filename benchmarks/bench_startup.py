@@ -0,0 +1,104 @@
+# Cold start: an import-time report for the entry points, then the main page and the
+# FrameView page each in a fresh process, timed through their first run (up to the
+# uploader, plus the stored runs list on the FrameView page) and from uploading a CSV to
+# the first preview, next to the page's own stage timings for that run. The pages run
+# under Streamlit's AppTest; the pause between the two stands in for the user picking a
+# file.
+# Run from the repo root: python benchmarks/bench_startup.py [seconds before the upload]
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from synthetic import frameview_run
+
+# What each entry point imports before it can do anything
+ENTRY_POINTS = {
+    'chart': "import chart",
+    'batch_render': "import batch_render",
+    'render_server': "import render_server",
+    'pages, before upload': "import streamlit, profiling, startup",
+    'page, after upload': "import streamlit, pandas, chart, export, large_data, render_cache, render_queue, text_fit, upload_cache",
+    'frameview, stored runs': "import streamlit, pandas, run_store, upload_cache",
+    'frameview, after upload': "import streamlit, pandas, chart, export, frameview_data, frameview_export, render_cache, run_store, text_fit, upload_cache",
+}
+# Page, and the file uploaded to it
+PAGES = {
+    'page': ("chart_generator.py", "test.csv"),
+    'frameview': (os.path.join("pages", "frameview_generator.py"), "frameview.csv"),
+}
+FRAMEVIEW_ROWS = 2000
+TOP_MODULES = 6
+PAUSE_SECONDS = 3
+
+PAGE_RUN = """
+import sys, time, warnings
+warnings.simplefilter("ignore")
+# As streamlit run does, for good rather than only while a script runs
+sys.path.insert(0, {root!r})
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({page!r}, default_timeout=300)
+start = time.perf_counter()
+at.run()
+print("seconds", time.perf_counter() - start)
+time.sleep({pause})
+with open({csv!r}, "rb") as file:
+    at.file_uploader[0].upload({csv_name!r}, file.read(), "text/csv")
+start = time.perf_counter()
+at.run()
+print("seconds", time.perf_counter() - start)
+if at.exception:
+    sys.exit(at.exception[0].value)
+print("stages", next(caption.value for caption in at.caption if caption.value.startswith("This run: "))[len("This run: "):])
+"""
+
+
+def import_report(statement):
+    # Total import time and the packages that take most of it (self time of every
+    # module, summed per top-level package), from python -X importtime
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stderr
+    packages = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_time, _, name = line[len("import time:"):].split("|")
+        if self_time.strip() == "self [us]":
+            continue
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_time)
+    total = sum(packages.values())
+    return total, sorted(((microseconds, package) for package, microseconds in packages.items()), reverse=True)[:TOP_MODULES]
+
+
+def page_run(page, csv_name, pause):
+    # In an empty folder with only config.yaml, so the render cache and run store start
+    # out empty
+    with tempfile.TemporaryDirectory() as directory:
+        shutil.copy(os.path.join(ROOT, "config.yaml"), directory)
+        if csv_name == "test.csv":
+            csv = os.path.join(ROOT, "TestFiles", csv_name)
+        else:
+            csv = os.path.join(directory, csv_name)
+            frameview_run(0, FRAMEVIEW_ROWS).to_csv(csv, index=False)
+        code = PAGE_RUN.format(root=ROOT, page=os.path.join(ROOT, page), pause=pause, csv=csv, csv_name=csv_name)
+        output = subprocess.run([sys.executable, "-c", code], cwd=directory, capture_output=True, text=True, check=True).stdout
+    # The pages print too
+    first_run, first_chart = (float(line.split()[1]) for line in output.splitlines() if line.startswith("seconds "))
+    stages = next(line[len("stages "):] for line in output.splitlines() if line.startswith("stages "))
+    return first_run, first_chart, stages
+
+
+if __name__ == "__main__":
+    pause = float(sys.argv[1]) if len(sys.argv) > 1 else PAUSE_SECONDS
+    for entry, statement in ENTRY_POINTS.items():
+        total, top = import_report(statement)
+        print(f"{entry:<22} {total/1000:7.0f} ms   " + ", ".join(f"{name} {microseconds/1000:.0f}" for microseconds, name in top))
+
+    for name, (page, csv_name) in PAGES.items():
+        first_run, first_chart, stages = page_run(page, csv_name, pause)
+        print(f"{name:<10} first run {first_run*1000:.0f} ms, upload to first preview {first_chart*1000:.0f} ms (after {pause:g} s)")
+        print(f"{'':<10} of which {stages}")
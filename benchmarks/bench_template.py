@@ -0,0 +1,51 @@
+# Throughput of rendering 100 datasets with the same styling: a generate_chart call per
+# dataset against one chart.ChartTemplate swapping the data, at every resolution in
+# config.yaml.
+# Run from the repo root: python benchmarks/bench_template.py [datasets]
+import os
+import sys
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import batch_render
+import chart
+import startup
+from synthetic import chart_df
+
+DATASETS = 100
+ROWS = 20
+
+
+def per_call(frames, args):
+    return [chart.generate_chart_bytes(df, **args) for df in frames]
+
+
+def template(frames, args):
+    chart_template = chart.ChartTemplate(**args)
+    try:
+        return [chart_template.render_bytes(df) for df in frames]
+    finally:
+        chart_template.close()
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DATASETS
+    config = startup.load_config(os.path.join(ROOT, "config.yaml")) or startup.DEFAULT_CONFIG
+    frames = [chart_df(ROWS, 3, subheading=False, seed=seed) for seed in range(count)]
+    print(f"{count} datasets of {ROWS} rows")
+    print(f"{'size':>10} {'per call (s)':>13} {'template (s)':>13} {'charts/s':>9} {'speedup':>8}")
+    for size in config['resolutions']:
+        args = batch_render.chart_args(frames[0], {'size': size}, config)
+        start = time.perf_counter()
+        expected = per_call(frames, args)
+        per_call_s = time.perf_counter() - start
+        start = time.perf_counter()
+        actual = template(frames, args)
+        template_s = time.perf_counter() - start
+        if actual != expected:
+            print(f"{size}: template output differs from generate_chart")
+        print(f"{size:>10} {per_call_s:>13.2f} {template_s:>13.2f} {count/template_s:>9.1f} {per_call_s/template_s:>7.2f}x")
@@ -0,0 +1,91 @@
+# Soak test for chart.generate_chart: many consecutive renders, optionally spread over a
+# thread pool, checking that resident memory stays flat and no figures are left behind.
+# Run from the repo root: python benchmarks/soak_render.py [renders] [threads]
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import chart
+from synthetic import chart_df
+
+RENDERS = 1000
+THREADS = 4
+SIZE = "1300x1300"
+SAMPLE_EVERY = 100
+# Allowed RSS growth between the first sample (after warm-up) and the last
+MAX_GROWTH_MB = 50
+DEFAULT_COLS = ['#f0991a', '#820000', '#32f01a', '#af1af0', '#070d0d', '#016795']
+
+
+def rss_mb():
+    # Current resident set size; falls back to the peak where /proc is unavailable, and
+    # without getrusage (Windows) to the memory tracemalloc sees, which still shows
+    # leaked figures and arrays
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        if resource is None:
+            return tracemalloc.get_traced_memory()[0] / 1e6
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def render(seed):
+    df = chart_df(20, 2, seed=seed)
+    colours = {"col1": DEFAULT_COLS[0], "col2": DEFAULT_COLS[1]}
+    legend = {"col1": "1", "col2": "2"}
+    data = chart.generate_chart_bytes(df, SIZE, DEFAULT_COLS[4], "score_1", seed % 2 == 0, df['heading'][seed % 20],
+                                      colours, DEFAULT_COLS[5], 0.4, 110, 30, 15, 12, 25, 15,
+                                      "Soak " + str(seed), 0.0, 1.05, "Higher scores indicate higher performance", legend)
+    # PNG signature, i.e. each thread got its own complete image
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    return len(data)
+
+
+def live_figures():
+    return sum(isinstance(obj, Figure) for obj in gc.get_objects())
+
+
+if __name__ == "__main__":
+    renders = int(sys.argv[1]) if len(sys.argv) > 1 else RENDERS
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else THREADS
+    if resource is None:
+        tracemalloc.start()
+
+    render(0)
+    gc.collect()
+    samples = [(0, rss_mb())]
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        done = 0
+        for _ in executor.map(render, range(1, renders + 1)):
+            done += 1
+            if done % SAMPLE_EVERY == 0 or done == renders:
+                samples.append((done, rss_mb()))
+                print(f"{done:>6} renders  {samples[-1][1]:8.1f} MB RSS  {done/(time.perf_counter()-start):6.2f} renders/s")
+
+    gc.collect()
+    growth = samples[-1][1] - samples[1][1] if len(samples) > 2 else 0.0
+    figures = live_figures()
+    print(f"\n{renders} renders on {threads} threads in {time.perf_counter()-start:.1f}s, "
+          f"RSS growth after first sample {growth:+.1f} MB, {figures} figures alive")
+
+    if growth > MAX_GROWTH_MB or figures:
+        print("FAIL: memory is not flat or figures leaked")
+        sys.exit(1)
@@ -0,0 +1,210 @@
+# Benchmark suite for the charting hot paths: CSV load, FrameView read and aggregation,
+# chart.generate_chart at every config.yaml resolution, and render scaling in rows and
+# in score_ columns. Everything runs on seeded synthetic data. Each case runs in its
+# own process and records its best wall time and the peak memory it adds, and the
+# results are compared with a stored baseline so slowdowns show up as regressions.
+# Run from the repo root:
+#   python benchmarks/suite.py                  compare with benchmarks/baseline.json
+#   python benchmarks/suite.py --save           record a new baseline
+#   python benchmarks/suite.py --only render    cases whose name contains "render"
+# Baselines are machine specific, re-record one before comparing on a new machine.
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    # Windows: no getrusage, cases are timed but their peak memory is not recorded
+    resource = None
+
+import matplotlib
+matplotlib.use("Agg")
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import batch_render
+import chart
+import frameview_data
+import startup
+from synthetic import chart_df, frameview_run
+
+CONFIG = startup.load_config(os.path.join(ROOT, "config.yaml")) or startup.DEFAULT_CONFIG
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+REPEATS = 3
+CASE_SECONDS = 30
+# A case is a regression when it is this much slower or larger than the baseline
+THRESHOLD = 0.25
+# Differences below these are noise whatever the ratio
+MIN_SECONDS = 0.01
+MIN_BYTES = 4 * 1024 * 1024
+
+ROWS = [10, 100, 1000, 10000]
+SCORE_COLUMNS = [1, 2, 3, 4, 5]
+SCALING_SIZE = "1920x1080"
+WARMUP_SIZE = "320x240"
+CSV_ROWS = 100_000
+FRAMEVIEW_RUNS = 100
+FRAMEVIEW_ROWS_PER_RUN = 1000
+
+
+def render(df, size):
+    args = batch_render.chart_args(df, {'size': size, 'sort': 'score_1'}, CONFIG)
+    return lambda: chart.generate_chart_bytes(df, **args)
+
+
+def csv_load(workdir):
+    path = os.path.join(workdir, "scores.csv")
+    chart_df(CSV_ROWS, 5).to_csv(path, index=False)
+    return lambda: pd.read_csv(path)
+
+
+def frameview_read(workdir):
+    path = os.path.join(workdir, "frameview.csv")
+    pd.concat([frameview_run(seed, FRAMEVIEW_ROWS_PER_RUN) for seed in range(FRAMEVIEW_RUNS)]).to_csv(path, index=False)
+    return lambda: frameview_data.read_frameview(path)
+
+
+def frameview_aggregate(workdir):
+    frames = [frameview_run(seed, FRAMEVIEW_ROWS_PER_RUN) for seed in range(FRAMEVIEW_RUNS)]
+    return lambda: frameview_data.aggregate_runs(frames)
+
+
+def cases():
+    # name -> setup(workdir), which makes the data and returns the function to time
+    found = {
+        'csv_load': csv_load,
+        'frameview_read': frameview_read,
+        'frameview_aggregate': frameview_aggregate,
+    }
+    for size in CONFIG['resolutions']:
+        found['render/' + size] = lambda workdir, size=size: render(chart_df(20, 3), size)
+    for rows in ROWS:
+        found[f'rows/{rows}'] = lambda workdir, rows=rows: render(chart_df(rows, 3), SCALING_SIZE)
+    for score_columns in SCORE_COLUMNS:
+        found[f'score_columns/{score_columns}'] = lambda workdir, score_columns=score_columns: render(chart_df(20, score_columns), SCALING_SIZE)
+    return found
+
+
+def max_rss():
+    # Peak resident set of this process in bytes (ru_maxrss is kB on Linux), None where
+    # it can't be read
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measure(name, repeats):
+    # Runs in a fresh process per case, so the peak resident memory it adds over the
+    # warmed-up interpreter belongs to that case alone. That includes the Agg pixel
+    # buffers, which tracemalloc would not see. Slow cases (big row counts) stop
+    # repeating once they have used up CASE_SECONDS.
+    warnings.filterwarnings("ignore", message="Creating legend with loc")
+    # Font cache, palette and backend set up outside the case, at a size small enough
+    # not to hide the case's own pixel buffers
+    render(chart_df(10, 1), WARMUP_SIZE)()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        function = cases()[name](workdir)
+        gc.collect()
+        before = max_rss()
+
+        best = None
+        spent = 0.0
+        for _ in range(repeats):
+            gc.collect()
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+            spent += elapsed
+            if spent > CASE_SECONDS:
+                break
+    return {'seconds': best, 'peak_bytes': None if before is None else max_rss() - before}
+
+
+def megabytes(peak_bytes):
+    return f"{'n/a':>9}" if peak_bytes is None else f"{peak_bytes/1e6:>9.1f}"
+
+
+def compare(results, baseline, threshold):
+    # Lines describing each case against the baseline, and the names that regressed
+    lines = []
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            lines.append(f"{name:<24} {result['seconds']:>9.3f} {'':>9} {megabytes(result['peak_bytes'])} {'':>9}  new")
+            continue
+        slower = (result['seconds'] > before['seconds'] * (1 + threshold)
+                  and result['seconds'] - before['seconds'] > MIN_SECONDS)
+        # Memory is only compared when both runs recorded it
+        measured = result['peak_bytes'] is not None and before['peak_bytes'] is not None
+        larger = (measured and result['peak_bytes'] > before['peak_bytes'] * (1 + threshold)
+                  and result['peak_bytes'] - before['peak_bytes'] > MIN_BYTES)
+        flags = [flag for flag, hit in (("SLOWER", slower), ("LARGER", larger)) if hit]
+        if flags:
+            regressions.append(name)
+        time_change = result['seconds'] / before['seconds'] - 1
+        memory_change = f"{'':>9}"
+        if measured:
+            memory_change = f"{result['peak_bytes'] / before['peak_bytes'] - 1 if before['peak_bytes'] else 0.0:>+9.0%}"
+        lines.append(f"{name:<24} {result['seconds']:>9.3f} {time_change:>+9.0%} {megabytes(result['peak_bytes'])} {memory_change}  {' '.join(flags)}")
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the charting hot paths against a stored baseline.")
+    parser.add_argument("--only", help="run only the cases whose name contains this")
+    parser.add_argument("--repeats", type=int, default=REPEATS, help=f"timed runs per case, best one kept (default: {REPEATS})")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline file (default: benchmarks/baseline.json)")
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help=f"allowed slowdown or growth (default: {THRESHOLD})")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)['cases']
+
+    results = {}
+    for name in cases():
+        if args.only and args.only not in name:
+            continue
+        # spawn, not fork, so nothing from earlier cases is inherited
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            results[name] = executor.submit(measure, name, args.repeats).result()
+        print(f"{name:<24} {results[name]['seconds']:>9.3f}", file=sys.stderr, flush=True)
+
+    lines, regressions = compare(results, baseline, args.threshold)
+    print(f"{'case':<24} {'time (s)':>9} {'vs base':>9} {'peak (MB)':>9} {'vs base':>9}")
+    for line in lines:
+        print(line)
+
+    if args.save:
+        # Cases left out with --only keep their old baseline
+        cases_out = dict(baseline, **results)
+        with open(args.baseline, 'w') as file:
+            json.dump({'machine': platform.platform(), 'python': platform.python_version(),
+                       'matplotlib': matplotlib.__version__, 'cases': cases_out}, file, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+
+    if regressions:
+        print(f"\n{len(regressions)} regressed: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
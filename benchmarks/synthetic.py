@@ -0,0 +1,59 @@
+# Seeded synthetic inputs shared by the benchmarks, so every script measures the same
+# kind of data and a given seed always gives the same frame, and the timing helpers
+# they share.
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def chart_df(rows, score_columns, subheading=True, seed=0):
+    # Laid out like TestFiles/test6.csv
+    rng = np.random.default_rng(seed)
+    data = {"heading": ["GPU " + str(i) for i in range(rows)]}
+    for i in range(score_columns):
+        data["score_" + str(i+1)] = rng.integers(1000, 20000, rows)
+    if subheading:
+        data["subheading"] = ["test" + str(i) for i in range(rows)]
+    return pd.DataFrame(data)
+
+
+FRAMEVIEW_RESOLUTIONS = ["1920x1080", "2560x1440", "3840x2160"]
+
+
+def frameview_run(seed, rows, extra_columns=0):
+    # One FrameView summary file; the extra columns stand in for the many the charts
+    # never use
+    rng = np.random.default_rng(seed)
+    data = {
+        "Application": ["game.exe"] * rows,
+        "Resolution": rng.choice(FRAMEVIEW_RESOLUTIONS, rows),
+        "GPU0": ["GPU " + str(seed)] * rows,
+        "Avg FPS": rng.uniform(60, 200, rows),
+        "1% FPS": rng.uniform(30, 100, rows),
+        "PCAT Power (Watts)": rng.uniform(150, 400, rows),
+    }
+    for i in range(extra_columns):
+        data["Extra " + str(i)] = rng.uniform(0, 1, rows)
+    return pd.DataFrame(data)
+
+
+def best_of(function, repeats=3):
+    # Fastest of repeats calls in seconds, and what the last call returned
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def median_ms(function, repeats=5):
+    # Median of repeats calls in milliseconds
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return sorted(times)[len(times)//2]
@@ -1,10 +1,18 @@
 # libraries
-import matplotlib.pyplot as plt
+import matplotlib
 import matplotlib.colors as mcolors
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.patches import Rectangle
+from matplotlib.path import Path
 import numpy as np
-import pandas as pd
 import textwrap
+import dataclasses
+import io
+
+import palette
+import profiling
+from palette import hex_to_rgb
 
 def gradientbars(bars, range, colmap):
       ax = bars[0].axes
@@ -14,192 +22,686 @@ def gradientbars(bars, range, colmap):
           bar.set_facecolor("none")
           x,y = bar.get_xy()
           w, h = bar.get_width(), bar.get_height()
+          # NaN scores leave the bar without a gradient
+          if not np.isfinite([x, y, w, h]).all():
+              continue
           grad = np.atleast_2d(np.linspace(0,1*w/w,256))
           ax.imshow(grad, extent=[x,x+w,y,y+h], aspect="auto", zorder=0, norm=mcolors.NoNorm(vmin=0,vmax=1), cmap=colmap)
       ax.axis(lim)  
 
-def hex_to_rgb(hex):
-    print(hex)    
-    hex = hex.replace("#", "")
-    rgb = []
-    for i in (0, 2, 4):
-        decimal = int(hex[i:i+2], 16)
-        rgb.append(decimal/255)
-    
-    return tuple(rgb)
-
-def adjust_brightness(color, factor):
-    return tuple(min(1, max(0, c * factor)) for c in color)
-
-
-def get_colors(colours):
-    cmaps = []
-    for key, value in colours.items():
-        col1_1 = adjust_brightness(value, 1.2)
-        col1_2 = adjust_brightness(value, 0.8)
-        
-        # Define colors to use in the colormap
-        colors1 = [col1_1, col1_2] 
-
-        # Create a custom colormap
-        cmap_name = key
-        cmaps.append(mcolors.LinearSegmentedColormap.from_list(cmap_name, colors1, N=256))
-
-    return cmaps
-
-
-
-def generate_chart(df, 
-                    filename, 
-                    size, 
-                    bg_color, 
-                    sorted_col, 
-                    is_ascending, 
-                    highlight, 
-                    colours, 
-                    highlight_color, 
-                    bar_width, 
-                    bar_score_offset, 
-                    title_font_size, 
-                    subtitle_font_size,
-                    axis_font_size, 
-                    legend_font_size,
-                    bar_data_font_size, 
-                    title, 
-                    x_title_pos, 
-                    y_title_pos, 
-                    sub_text, 
-                    legend_text
-                    ):
-    x_tick_font_size = 15
-    if size == "3840x2160":
-        title_font_size = title_font_size*2
-        subtitle_font_size = subtitle_font_size*2
-        axis_font_size = axis_font_size*2
-        legend_font_size = legend_font_size*2
-        bar_data_font_size = bar_data_font_size*2
-        x_tick_font_size = x_tick_font_size*2
-         
-    col_keys = []
-
-    for key, value in colours.items():
-        col_keys.append(key)
-        colours[key] = hex_to_rgb(colours[key])
-
-    colours["highlight"] = hex_to_rgb(highlight_color)
-    custom_cmaps = get_colors(colours)
-
-
-    # Sort DF
-    if sorted_col != "None":
-        df = df.sort_values(by=[sorted_col], ascending=is_ascending)
-
-
-
-    # Set Plot size
-    size = size.split("x")
-    px = 1/plt.rcParams['figure.dpi']
-    fig, ax = plt.subplots(figsize=(int(size[0])*px,int(size[1])*px))
-
-
-
-    # # Change background colors
-    fig.patch.set_facecolor(bg_color) 
-    ax.set_facecolor(bg_color)   
-
-    # # Change font color
-    ax.tick_params(axis='y', colors='white', width=2)  # Y-axis tick labels
-    ax.tick_params(axis='x', colors='white', width=2)  # X-axis tick labels
-    title = ax.set_title(title, fontsize = title_font_size, color='white', bbox=dict(facecolor='#005CB9', edgecolor='black', boxstyle='square,pad=0.2'), loc='center', x=x_title_pos, y=y_title_pos)
-
-    if sub_text != "":
-        wrapped_text = "\n".join(textwrap.wrap(sub_text, width=25))
-        ax.text(0.95, 1.02, wrapped_text, transform=ax.transAxes, color='white',fontsize=subtitle_font_size, verticalalignment='center', horizontalalignment='right', bbox=dict(facecolor='#005CB9',boxstyle='square,pad=0.5'))
-
-
-    # Set the positions for the bars
-    positions = np.arange(len(df['heading']))
-    bars = []
-
-    # Create Bars
-    for i, column in enumerate(df.columns):
-        if df[column].name.startswith("score_"):
-            bars.append(ax.barh(positions + (i - len(df.columns)/2) * bar_width, df[column], bar_width, color='xkcd:red', edgecolor='xkcd:red'))
-
-
-    # Apply Gradients to bars
-    for i, bar in enumerate(bars):
-        gradientbars(bar, 3000, custom_cmaps[i])
-        ax.bar_label(bar, padding=-bar_score_offset, color='white', fontsize=bar_data_font_size-2, label_type='edge', fontweight='bold')
-        
-        
-
-
-    if highlight != "None":
-        for i, bar_group in enumerate(bars):
-            for bar, labal in zip(bar_group, df['heading']):
-                if labal == highlight:
-                    # bar.set_color(highlight_color)
-
-                    # Little bit hacky, gradientbars function take an array of bars
-                    bar.set_zorder(1)
-                    bar.set_facecolor("none")
-                    x,y = bar.get_xy()
-                    w, h = bar.get_width(), bar.get_height()
-                    grad = np.atleast_2d(np.linspace(0,1*w/w,256))
-                    ax.imshow(grad, extent=[x,x+w,y,y+h], aspect="auto", zorder=0, norm=mcolors.NoNorm(vmin=0,vmax=1), cmap=custom_cmaps[len(custom_cmaps)-1])
-
-                    bar.set_edgecolor(highlight_color)
+# Every gradient is a lookup into a table of this many colours
+GRADIENT_STEPS = palette.STEPS
+
+# A compound image takes about as long to draw as this many one-bar images, plus this
+# many more for every million pixels of axes it is resampled over
+LAYER_BARS = 30
+LAYER_BARS_PER_MPX = 50
+
+# The images are already RGBA, so their colormap goes unused; handing imshow one saves
+# it copying the default colormap for every image
+RGBA_CMAP = matplotlib.colormaps["gray"]
+
+
+class CompoundGradient:
+    # One image for every bar on the chart instead of one per bar. Image rows are laid
+    # out at roughly screen resolution, each row takes the gradient of the bar under it
+    # (normalised to that bar's own width) and the bar outlines clip the image, so the
+    # look matches gradientbars but the artist count no longer grows with the data.
+    # When bars of neighbouring rows overlap (many series at a large bar_width) a row
+    # can't tell which bar is on top, so each bar group gets its own image instead, and
+    # the highlighted bars one more per group drawn over the rest: the order
+    # gradientbars draws in. An image costs about the same to draw whatever the bar
+    # count, so charts with only a few bars for their size get one small image per bar
+    # instead, as gradientbars would. Bars with a NaN score are left without a gradient.
+    # The geometry is worked out once; colour() can then recolour the same images.
+
+    def __init__(self, bar_groups, columns=1024, geometry=None):
+        # geometry is the bars' x, y, width and height as flat arrays, series after
+        # series (bar_geometry), when the layout already has them
+        ax = bar_groups[0][0].axes
+        self.ax = ax
+        self.lim = ax.get_xlim()+ax.get_ylim()
+        # Fixed limits, so adding each image doesn't autoscale the axes again
+        ax.axis(self.lim)
+        self.columns = columns
+        self.groups = len(bar_groups)
+        self.images = []
+        self.highlight_layers = []
+        self.highlight_images = []
+        self._highlight_mask = None
+
+        for bars in bar_groups:
+            for bar in bars:
+                bar.set_zorder(1)
+                bar.set_facecolor("none")
+        self.series = np.concatenate([np.full(len(bars), i) for i, bars in enumerate(bar_groups)])
+
+        if geometry is None:
+            geometry = ([bar.get_x() for bars in bar_groups for bar in bars],
+                        [bar.get_y() for bars in bar_groups for bar in bars],
+                        [bar.get_width() for bars in bar_groups for bar in bars],
+                        [bar.get_height() for bars in bar_groups for bar in bars])
+        self.x, self.y, self.w, self.h = (np.asarray(v, dtype=float) for v in geometry)
+        self.finite = np.isfinite(self.x) & np.isfinite(self.y) & np.isfinite(self.w) & np.isfinite(self.h)
+
+        # Bars within a group never overlap, they are a row apart
+        finite = np.flatnonzero(self.finite)
+        bottoms = np.minimum(self.y, self.y+self.h)[finite]
+        tops = np.maximum(self.y, self.y+self.h)[finite]
+        order = np.argsort(bottoms, kind="stable")
+        self.overlapping = bool(np.any(np.maximum.accumulate(tops[order])[:-1] > bottoms[order][1:] + 1e-9))
+
+        layers = self.groups if self.overlapping else 1
+        area = ax.bbox.width * ax.bbox.height / 1e6
+        self.one_per_bar = len(finite) < layers * (LAYER_BARS + LAYER_BARS_PER_MPX * area)
+        if self.one_per_bar:
+            self.layers = []
+        elif self.overlapping:
+            self.layers = [self._layer(np.flatnonzero(self.series == i)) for i in range(self.groups)]
+        else:
+            self.layers = [self._layer(np.arange(len(self.x)))]
+
+    def _layer(self, bars):
+        # Image rows, gradient steps and clip path for the given bars, which must not
+        # overlap each other. None when they cover no area.
+        bars = bars[self.finite[bars]]
+        x, y, w, h = self.x[bars], self.y[bars], self.w[bars], self.h[bars]
+        if len(x) == 0:
+            return None
+        x_min = min(x.min(), (x+w).min())
+        x_max = max(x.max(), (x+w).max())
+        y_min = min(y.min(), (y+h).min())
+        y_max = max(y.max(), (y+h).max())
+        if x_max == x_min or y_max == y_min:
+            return None
+
+        # Twice the on-screen pixel density so bar edges land within half a pixel
+        lim = self.lim
+        rows = int(np.ceil(2 * self.ax.bbox.height * (y_max - y_min) / abs(lim[3] - lim[2]))) + 1
+        row_centres = y_min + (np.arange(rows) + 0.5) * (y_max - y_min) / rows
+
+        # Find the bar under each row
+        bottoms = np.minimum(y, y+h)
+        tops = np.maximum(y, y+h)
+        order = np.argsort(bottoms)
+        under = np.searchsorted(bottoms[order], row_centres, side="right") - 1
+        covered = under >= 0
+        under = order[np.clip(under, 0, None)]
+        covered &= row_centres < tops[under]
+
+        grid = x_min + (np.arange(self.columns) + 0.5) * (x_max - x_min) / self.columns
+        row_w = w[under]
+        safe_w = np.where(row_w == 0, 1, row_w)
+        grad = np.clip((grid[None, :] - x[under][:, None]) / safe_w[:, None], 0, 1)
+
+        # Clip to the union of the bar rectangles
+        verts = np.empty((len(x), 5, 2))
+        verts[:, :, 0] = x[:, None] + w[:, None] * np.array([0, 1, 1, 0, 0])
+        verts[:, :, 1] = y[:, None] + h[:, None] * np.array([0, 0, 1, 1, 0])
+        codes = np.tile([Path.MOVETO, Path.LINETO, Path.LINETO, Path.LINETO, Path.CLOSEPOLY], len(x))
+        return {
+            # Index of the bar under each row, into the chart's bars
+            'under': bars[under],
+            'covered': covered,
+            # Same lookup Colormap.__call__ does
+            'steps': np.minimum((grad * GRADIENT_STEPS).astype(int), GRADIENT_STEPS - 1).astype(np.uint8),
+            'extent': [x_min, x_max, y_min, y_max],
+            'clip_path': Path(verts.reshape(-1, 2), codes),
+        }
+
+    def _draw(self, layer, luts, lut_index, image):
+        # The layer coloured from the stacked luts, lut_index giving each bar's table,
+        # onto image or a new image
+        if layer is None:
+            return None
+        rgba = luts[lut_index[layer['under']][:, None], layer['steps']]
+        rgba[~layer['covered']] = 0
+        if image is None:
+            image = self.ax.imshow(rgba, extent=layer['extent'], origin="lower", aspect="auto", interpolation="nearest", zorder=0, cmap=RGBA_CMAP)
+            image.set_clip_path(layer['clip_path'], self.ax.transData)
+        else:
+            image.set_data(rgba)
+        return image
+
+    def _draw_bar(self, bar, lut, highlighted, image):
+        # One bar's gradient onto image or a new image, highlighted bars over the others
+        zorder = 0.5 if highlighted else 0
+        if image is None:
+            x, y, w, h = self.x[bar], self.y[bar], self.w[bar], self.h[bar]
+            image = self.ax.imshow(lut[None], extent=[x, x+w, y, y+h], aspect="auto", zorder=zorder, cmap=RGBA_CMAP)
+        else:
+            image.set_data(lut[None])
+            image.set_zorder(zorder)
+        return image
+
+    def colour(self, luts, highlight_mask=None, highlight_lut=None):
+        # luts are GRADIENT_STEPS x 4 uint8 colour tables, one per bar group
+        lut_index = self.series.copy()
+        luts = list(luts)
+        mask = None
+        if highlight_mask is not None and highlight_lut is not None:
+            mask = np.tile(np.asarray(highlight_mask, dtype=bool), self.groups)
+            luts.append(highlight_lut)
+        # Stacked table of every series plus the highlight
+        luts = np.stack(luts)
+
+        if self.one_per_bar or not self.overlapping:
+            if mask is not None:
+                lut_index[mask] = len(luts) - 1
+        elif not (mask is None and self._highlight_mask is None
+                  or mask is not None and self._highlight_mask is not None and np.array_equal(mask, self._highlight_mask)):
+            # Other rows highlighted, their bars need images of their own
+            self._remove_highlights()
+            self._highlight_mask = mask
+            if mask is not None:
+                self.highlight_layers = [self._layer(np.flatnonzero(mask & (self.series == i))) for i in range(self.groups)]
+                self.highlight_images = [None] * self.groups
+
+        if self.one_per_bar:
+            bars = np.flatnonzero(self.finite)
+            highlighted = mask if mask is not None else np.zeros(len(lut_index), dtype=bool)
+            images = self.images or [None] * len(bars)
+            self.images = [self._draw_bar(bar, luts[lut_index[bar]], highlighted[bar], image)
+                           for bar, image in zip(bars, images)]
+        else:
+            images = self.images or [None] * len(self.layers)
+            self.images = [self._draw(layer, luts, lut_index, image) for layer, image in zip(self.layers, images)]
+        if self.highlight_layers:
+            highlight_index = np.full_like(lut_index, len(luts) - 1)
+            self.highlight_images = [self._draw(layer, luts, highlight_index, image)
+                                     for layer, image in zip(self.highlight_layers, self.highlight_images)]
+        self.ax.axis(self.lim)
+        return [image for image in self.images + self.highlight_images if image is not None]
+
+    def _remove_highlights(self):
+        for image in self.highlight_images:
+            if image is not None:
+                image.remove()
+        self.highlight_layers = []
+        self.highlight_images = []
+        self._highlight_mask = None
+
+    def remove(self):
+        # Takes every image off the axes
+        self._remove_highlights()
+        for image in self.images:
+            if image is not None:
+                image.remove()
+        self.images = []
+
+
+# Live previews are rendered at about this width in pixels, and should come back within
+# the target time so the page keeps up with slider changes
+PREVIEW_WIDTH = 960
+PREVIEW_TARGET_MS = 250
+
+
+def preview_scale(size, width=PREVIEW_WIDTH):
+    return min(1.0, width / int(size.split("x")[0]))
+
+
+# generate_chart arguments that decide the figure, the row order or the bar geometry.
+# A change to any of them rebuilds the chart, everything else is applied to the
+# artists already on it.
+LAYOUT_PARAMS = ('size', 'sorted_col', 'is_ascending', 'bar_width', 'gradient_mode', 'scale', 'x_max')
+
+# Arguments only the data artists (bars, gradient, labels, legend) depend on, which a
+# data swap redraws anyway
+DATA_STYLE_PARAMS = {'colours', 'highlight', 'highlight_color', 'bar_score_offset', 'bar_data_font_size', 'legend_font_size', 'legend_text'}
+
+
+def font_scale(size):
+    # Every font is drawn twice as big at 4K
+    return 2 if size == "3840x2160" else 1
+
+
+def font_sizes(params):
+    fonts = {
+        'title': params['title_font_size'],
+        'subtitle': params['subtitle_font_size'],
+        'axis': params['axis_font_size'],
+        'legend': params['legend_font_size'],
+        'bar_data': params['bar_data_font_size'],
+        'x_tick': 15,
+    }
+    return {key: value*font_scale(params['size']) for key, value in fonts.items()}
+
+
+# Bar gid prefix in gradient_mode="vector", followed by the hex colour and series/row
+VECTOR_GRADIENT_GID = "gradient-bar"
+# How far the y tick labels sit above the centre of their row
+TICK_OFFSET = 0.2
+
+
+def bar_layout(df, bar_width):
+    # Where everything goes for an already sorted df, worked out once as arrays: one row
+    # of bar centres and widths per score column, the tick positions, and the headings
+    # that highlight masks are made from
+    columns = [i for i, column in enumerate(df.columns) if column.startswith("score_")]
+    positions = np.arange(len(df))
+    offsets = (np.array(columns, dtype=float) - len(df.columns)/2) * bar_width
+    return {
+        'columns': [df.columns[i] for i in columns],
+        'centres': positions[None, :] + offsets[:, None],
+        'widths': df.iloc[:, columns].to_numpy(dtype=float).T,
+        'ticks': positions - TICK_OFFSET,
+        'headings': df['heading'].to_numpy(),
+    }
+
+
+def bar_geometry(layout, bar_width):
+    # x, y, width and height of every bar, series after series, as barh lays them out
+    widths = layout['widths'].ravel()
+    y = (layout['centres'] - bar_width/2).ravel()
+    return np.zeros_like(widths), y, widths, np.full_like(widths, bar_width)
+
+
+class Chart:
+    # A chart that keeps its figure and artists between renders. update() compares the
+    # new arguments with the last ones and only touches what changed: recolouring the
+    # gradient image, moving the title, swapping the highlighted bars and so on. New
+    # data only replaces the data artists, LAYOUT_PARAMS changes rebuild it from
+    # scratch. The DataFrame passed in must not be modified in place afterwards, it is
+    # kept to spot data changes.
+
+    def __init__(self):
+        self.fig = None
+        self.ax = None
+        self.df = None
+        self.params = None
+        self.rebuilds = 0
+        self.swaps = 0
+        self.updates = 0
+        self._source = None
+        self.layout = None
+        self._reset_artists()
+
+    def _reset_artists(self):
+        self.bars = []
+        self.bar_labels = []
+        self.gradient = None
+        self.legend = None
+        self.title = None
+        self.subtitle = None
+        self._highlighted = []
+
+    def update(self, df, spec=None, **params):
+        # A ChartSpec, generate_chart's arguments by name, or a spec with some of them
+        # replaced
+        if spec is not None:
+            params = dict(spec.params(), **params)
+        params.setdefault('gradient_mode', "compound")
+        params.setdefault('scale', 1.0)
+        params.setdefault('x_max', None)
+
+        rebuild = (self.fig is None
+                   or params['gradient_mode'] == "per_bar"
+                   or any(params[key] != self.params[key] for key in LAYOUT_PARAMS))
+        if rebuild:
+            self._build(df, params)
+            self.rebuilds += 1
+        else:
+            changed = {key for key in params if params[key] != self.params[key]}
+            if not (df is self._source or df.equals(self._source)):
+                # New data on the same styled figure, the data artists pick up every
+                # other argument as they are redrawn
+                self._swap_data(df, params)
+                self.swaps += 1
+                changed -= DATA_STYLE_PARAMS
+            if changed:
+                self._apply(changed, params)
+                self.updates += 1
+
+        self.params = dict(params, colours=dict(params['colours']), legend_text=dict(params['legend_text']))
+        return self
+
+    def _build(self, df, p):
+        self.close()
+        self._build_figure(p)
+        self._build_data(df, p, font_sizes(p))
+
+    @profiling.timed("figure")
+    def _build_figure(self, p):
+        fonts = font_sizes(p)
+
+        # Set Plot size
+        # Figure/FigureCanvasAgg rather than pyplot: nothing is registered globally, so
+        # renders can run on several threads at once and the figure is freed on close
+        size = p['size'].split("x")
+        # scale < 1 keeps the figure size in inches (so every font, offset and margin lands
+        # in the same place) and only lowers the dpi, giving a cheap downsized preview
+        dpi = matplotlib.rcParams['figure.dpi']
+        px = 1/dpi
+        self.fig = Figure(figsize=(int(size[0])*px,int(size[1])*px), dpi=dpi*p['scale'])
+        FigureCanvasAgg(self.fig)
+        ax = self.ax = self.fig.subplots()
+
+        self._style_background(p)
+
+        # # Change font color
+        ax.tick_params(axis='y', colors='white', width=2)  # Y-axis tick labels
+        ax.tick_params(axis='x', colors='white', width=2)  # X-axis tick labels
+        self._style_title(p, fonts)
+
+        self.subtitle = ax.text(0.95, 1.02, "", transform=ax.transAxes, color='white', verticalalignment='center', horizontalalignment='right', bbox=dict(facecolor='#005CB9',boxstyle='square,pad=0.5'))
+        self._style_subtitle(p, fonts)
+
+        ax.spines[['right', 'top']].set_visible(False)
+
+        ax.spines[['left', 'bottom']].set_color("White")
+        ax.spines[['left', 'bottom']].set_linewidth(2.5)
+        ax.spines[['left', 'bottom']].set(joinstyle="bevel")
+
+        # plt.subplots_adjust(left=left_margin_size, right=right_margin_size)
+
+        ax.tick_params(axis='y', labelsize=fonts['axis'])
+        ax.tick_params(axis='x', labelsize=fonts['x_tick'])
+
+    def _build_data(self, df, p, fonts):
+        ax = self.ax
+        self._source = df
+
+        # Sort DF
+        with profiling.stage("sort"):
+            if p['sorted_col'] != "None":
+                df = df.sort_values(by=[p['sorted_col']], ascending=p['is_ascending'])
+        self.df = df
+        with profiling.stage("layout"):
+            layout = self.layout = bar_layout(df, p['bar_width'])
+
+        # Create Bars
+        # The Series rather than layout['widths'] so bar labels keep the data's own format
+        with profiling.stage("barh"):
+            for column, centres in zip(layout['columns'], layout['centres']):
+                self.bars.append(ax.barh(centres, df[column], p['bar_width'], color='xkcd:red', edgecolor='xkcd:red'))
+        self._bar_linewidth = self.bars[0][0].get_linewidth() if self.bars and len(self.bars[0]) else None
+
+        if p['x_max'] is not None:
+            # Same x axis for every page of a paged chart, set before the gradient
+            # geometry is worked out from the axes limits
+            ax.set_xlim(right=p['x_max'] * (1 + ax.margins()[0]))
+
+        self._colour_bars(p)
+        self._label_bars(p, fonts)
+
+        if 'subheading' in df:
+            # # Set the y-ticks to be the positions and labels
+            y_labels = [f"{heading}\n{subheading}" for heading, subheading in zip(df['heading'], df['subheading'])]
+        else:
+            # # Set the y-ticks to be the positions and labels
+            y_labels = [f"{heading}" for heading in df['heading']]
+
+        with profiling.stage("ticks"):
+            ax.set_yticks(layout['ticks'])
+            ax.set_yticklabels(y_labels, ha='right')
+
+        self._make_legend(p, fonts)
+
+    def _swap_data(self, df, p):
+        # Take the data artists off the axes and draw the new data on the same styled
+        # figure, autoscaling from the new bars as a fresh axes would
+        for container in self.bars:
+            container.remove()
+        if self.gradient is not None:
+            self.gradient.remove()
+        for label in self.bar_labels:
+            label.remove()
+        if self.legend is not None:
+            self.legend.remove()
+        self.bars = []
+        self.bar_labels = []
+        self.gradient = None
+        self.legend = None
+        self._highlighted = []
+
+        self.ax.relim()
+        self.ax.set_autoscale_on(True)
+        self._build_data(df, p, font_sizes(p))
+
+    def _apply(self, changed, p):
+        fonts = font_sizes(p)
+        if 'bg_color' in changed:
+            self._style_background(p)
+        if changed & {'title', 'title_font_size', 'x_title_pos', 'y_title_pos'}:
+            self._style_title(p, fonts)
+        if changed & {'sub_text', 'subtitle_font_size'}:
+            self._style_subtitle(p, fonts)
+        if changed & {'colours', 'highlight', 'highlight_color'}:
+            self._colour_bars(p)
+        if changed & {'bar_score_offset', 'bar_data_font_size'}:
+            self._label_bars(p, fonts)
+        if 'axis_font_size' in changed:
+            self.ax.tick_params(axis='y', labelsize=fonts['axis'])
+        if changed & {'colours', 'legend_font_size', 'legend_text'}:
+            self._make_legend(p, fonts)
+
+    def _style_background(self, p):
+        # # Change background colors
+        self.fig.patch.set_facecolor(p['bg_color'])
+        self.ax.set_facecolor(p['bg_color'])
+
+    def _style_title(self, p, fonts):
+        # Calling set_title again updates the same Text artist
+        self.title = self.ax.set_title(p['title'], fontsize = fonts['title'], color='white', bbox=dict(facecolor='#005CB9', edgecolor='black', boxstyle='square,pad=0.2'), loc='center', x=p['x_title_pos'], y=p['y_title_pos'])
+
+    def _style_subtitle(self, p, fonts):
+        wrapped_text = "\n".join(textwrap.wrap(p['sub_text'], width=25))
+        self.subtitle.set_text(wrapped_text)
+        self.subtitle.set_fontsize(fonts['subtitle'])
+        self.subtitle.set_visible(p['sub_text'] != "")
+
+    @profiling.timed("gradient")
+    def _colour_bars(self, p):
+        highlight = p['highlight']
+        # Colormaps and lookup tables come prebuilt from the shared palette registry
+        series_hex = list(p['colours'].values())[:len(self.bars)]
+
+        # Apply Gradients to bars
+        # "compound" draws one image for all bars, "per_bar" is the original one image per bar
+        # and "vector" leaves the gradients to the SVG export
+        highlight_mask = None
+        if highlight != "None":
+            highlight_mask = self.layout['headings'] == highlight
+
+        if p['gradient_mode'] == "per_bar":
+            for i, bar in enumerate(self.bars):
+                gradientbars(bar, 3000, palette.registry.colormap(series_hex[i]))
+        elif p['gradient_mode'] == "vector":
+            # Flat bars tagged with the colour they should fade through, export.py swaps
+            # the tags for shared SVG gradient definitions
+            for i, bars in enumerate(self.bars):
+                for j, bar in enumerate(bars):
+                    hex = series_hex[i]
+                    if highlight_mask is not None and highlight_mask[j]:
+                        hex = p['highlight_color']
+                    bar.set_facecolor(hex)
+                    bar.set_gid(f"{VECTOR_GRADIENT_GID}-{hex.lstrip('#').lower()}-{i}-{j}")
+        elif self.bars:
+            if self.gradient is None:
+                self.gradient = CompoundGradient(self.bars, geometry=bar_geometry(self.layout, p['bar_width']))
+            self.gradient.colour([palette.registry.lut(hex) for hex in series_hex], highlight_mask, palette.registry.lut(p['highlight_color']))
+
+        # Put back the bars highlighted last time
+        for bar in self._highlighted:
+            bar.set_edgecolor('xkcd:red')
+            bar.set_linewidth(self._bar_linewidth)
+        self._highlighted = []
+
+        # Only the highlighted rows are visited, straight from the mask
+        if highlight_mask is not None:
+            rows = np.flatnonzero(highlight_mask)
+            for bar_group in self.bars:
+                for row in rows:
+                    bar = bar_group[row]
+                    # Compound gradients already carry the highlight rows
+                    if p['gradient_mode'] == "per_bar":
+                        gradientbars([bar], 3000, palette.registry.colormap(p['highlight_color']))
+
+                    bar.set_edgecolor(p['highlight_color'])
                     bar.set_linewidth(2)
-        
-
-
-    ax.spines[['right', 'top']].set_visible(False)
-
-    ax.spines[['left', 'bottom']].set_color("White")
-    ax.spines[['left', 'bottom']].set_linewidth(2.5)
-    ax.spines[['left', 'bottom']].set(joinstyle="bevel")
-
-
-    if 'subheading' in df:
-        # # Set the y-ticks to be the positions and labels
-        y_labels = [f"{heading}\n{subheading}" for heading, subheading in zip(df['heading'], df['subheading'])]
-    else:
-        # # Set the y-ticks to be the positions and labels
-        y_labels = [f"{heading}" for heading in df['heading']]
-
-
-
-    positions = positions.astype('float64')
-    
-    # Apply offset
-    for i, pos in enumerate(positions):
-        positions[i] = float(positions[i]) - 0.2
-
-    ax.set_yticks(positions)
-    ax.set_yticklabels(y_labels, ha='right')
-
-    # plt.subplots_adjust(left=left_margin_size, right=right_margin_size)
-
-    plt.yticks(fontsize=axis_font_size)
-    plt.xticks(fontsize=x_tick_font_size)
-
-
-    legend = []
-    col_index = 0
-
-    for i, column in enumerate(df.columns):
-        if df[column].name.startswith("score_"):
-            legend.append(Rectangle((0, 0), 20, 20, fc=colours[col_keys[col_index]], edgecolor='black', label=legend_text["col"+str(col_index+1)]))
-            col_index = col_index + 1
-
-
-    ax.legend(bbox_to_anchor=(-0.05, 0), handles=legend, fontsize=legend_font_size/2, handlelength=2.5, handleheight=2, borderaxespad=0.5)
-
-    # plt.show()
-    plt.savefig(filename)
-
-    return df
+                    self._highlighted.append(bar)
+
+    @profiling.timed("bar_label")
+    def _label_bars(self, p, fonts):
+        for label in self.bar_labels:
+            label.remove()
+        self.bar_labels = []
+        for bar in self.bars:
+            self.bar_labels.extend(self.ax.bar_label(bar, padding=-p['bar_score_offset'], color='white', fontsize=fonts['bar_data']-2, label_type='edge', fontweight='bold'))
+
+    @profiling.timed("legend")
+    def _make_legend(self, p, fonts):
+        if self.legend is not None:
+            self.legend.remove()
+
+        colours = p['colours']
+        col_keys = list(p['colours'].keys())
+        legend = []
+        col_index = 0
+
+        for i, column in enumerate(self.df.columns):
+            if self.df[column].name.startswith("score_"):
+                legend.append(Rectangle((0, 0), 20, 20, fc=hex_to_rgb(colours[col_keys[col_index]]), edgecolor='black', label=p['legend_text']["col"+str(col_index+1)]))
+                col_index = col_index + 1
+
+
+        self.legend = self.ax.legend(bbox_to_anchor=(-0.05, 0), handles=legend, fontsize=fonts['legend']/2, handlelength=2.5, handleheight=2, borderaxespad=0.5)
+
+    def save(self, filename, format="png", **kwargs):
+        # filename can be a path or any binary file object (e.g. BytesIO)
+        timer = profiling.active()
+        if timer is not None:
+            timer.counts.update(profiling.artist_counts(self.fig))
+        # Drawing happens here, so tick label and legend layout land in this stage too
+        with profiling.stage("savefig"):
+            self.fig.savefig(filename, format=format, **kwargs)
+
+    def to_bytes(self, format="png", **kwargs):
+        buffer = io.BytesIO()
+        self.save(buffer, format, **kwargs)
+        return buffer.getvalue()
+
+    def close(self):
+        if self.fig is not None:
+            # Break the figure's reference cycles now instead of waiting for the collector
+            self.fig.clear()
+        self.fig = None
+        self.ax = None
+        self._reset_artists()
+
+
+# Arguments stored as tuples of (key, value) pairs in a ChartSpec, handed out as dicts
+MAPPING_FIELDS = ('colours', 'legend_text')
+
+
+@dataclasses.dataclass(frozen=True)
+class ChartSpec:
+    # Everything a chart needs besides its data, in generate_chart's argument order.
+    # Frozen and hashable, so equal specs can key caches and group batch jobs; the
+    # colours and legend_text mappings are kept as tuples of pairs for that.
+    size: str
+    bg_color: str
+    sorted_col: str
+    is_ascending: bool
+    highlight: str
+    colours: tuple
+    highlight_color: str
+    bar_width: float
+    bar_score_offset: float
+    title_font_size: float
+    subtitle_font_size: float
+    axis_font_size: float
+    legend_font_size: float
+    bar_data_font_size: float
+    title: str
+    x_title_pos: float
+    y_title_pos: float
+    sub_text: str
+    legend_text: tuple
+    gradient_mode: str = "compound"
+    scale: float = 1.0
+    x_max: float = None
+
+    def __post_init__(self):
+        for name in MAPPING_FIELDS:
+            value = getattr(self, name)
+            if isinstance(value, dict):
+                object.__setattr__(self, name, tuple(value.items()))
+
+    @classmethod
+    def bind(cls, *args, **kwargs):
+        # From generate_chart's arguments after df and filename: positional, by name,
+        # or an existing spec with some of them replaced
+        if args and isinstance(args[0], ChartSpec):
+            if len(args) > 1:
+                raise TypeError("positional arguments after a ChartSpec, pass changes by name")
+            return args[0].replace(**kwargs)
+        return cls(*args, **kwargs)
+
+    def replace(self, **changes):
+        return dataclasses.replace(self, **changes) if changes else self
+
+    def params(self):
+        # By name, as Chart.update takes them, with the mappings as dicts again
+        params = {field.name: getattr(self, field.name) for field in dataclasses.fields(self)}
+        for name in MAPPING_FIELDS:
+            params[name] = dict(params[name])
+        return params
+
+
+def generate_chart(df, filename, *args, **kwargs):
+    # The ChartSpec arguments, positional or by name, or a ChartSpec itself
+    chart = Chart()
+    try:
+        chart.update(df, ChartSpec.bind(*args, **kwargs))
+        chart.save(filename)
+        return chart.df
+    finally:
+        chart.close()
+
+
+def generate_chart_bytes(df, *args, filename=None, **kwargs):
+    # Same arguments as generate_chart minus filename, renders to memory and returns
+    # the PNG bytes. Pass filename to also keep a copy on disk.
+    buffer = io.BytesIO()
+    generate_chart(df, buffer, *args, **kwargs)
+    data = buffer.getvalue()
+
+    if filename is not None:
+        with open(filename, "wb") as file:
+            file.write(data)
+
+    return data
+
+
+def bind_params(*args, **kwargs):
+    # generate_chart arguments after df and filename, by name with the defaults filled in
+    return ChartSpec.bind(*args, **kwargs).params()
+
+
+class ChartTemplate:
+    # The same styled chart for many datasets. Takes generate_chart's styling arguments
+    # once; the figure, spines, title and subtitle are made on the first render and
+    # later renders only swap the data artists on the same axes.
+
+    def __init__(self, *args, **kwargs):
+        self.spec = ChartSpec.bind(*args, **kwargs)
+        self.chart = Chart()
+
+    def render(self, df, filename, format="png", **overrides):
+        # overrides replace template arguments for this dataset only, e.g. colours and
+        # legend_text when the score columns differ. Returns the sorted df.
+        self.chart.update(df, self.spec, **overrides)
+        self.chart.save(filename, format)
+        return self.chart.df
+
+    def render_bytes(self, df, format="png", **overrides):
+        buffer = io.BytesIO()
+        self.render(df, buffer, format, **overrides)
+        return buffer.getvalue()
+
+    def close(self):
+        self.chart.close()
 
 
 
@@ -1,38 +1,29 @@
 import streamlit as st
-import pandas as pd
-from matplotlib.image import imread
 
-import yaml
-import os
-import math
+import io
+import time
+import zipfile
+from concurrent.futures import CancelledError
 
-import chart
+import profiling
+import startup
 
-def map(number, inMin, inMax, outMin, outMax):
-    return (number - inMin) * (outMax - outMin) / (inMax - inMin) + outMin
-
-def load_config(file_path):
-    with open(file_path, 'r') as file:
-        config = yaml.safe_load(file)
-    return config
-
-def save_config(config, file_path):
-    with open(file_path, 'w') as file:
-        yaml.dump(config, file, default_flow_style=False)
+# pandas, matplotlib and the renderer are only imported once a file is uploaded (and
+# usually already loaded by then, see warm_up_in_background below), so the uploader
+# shows without waiting for them
+startup.use_agg()
 
 config_file_path = 'config.yaml'
 
-# Load the current configuration
-if os.path.exists(config_file_path):
-    config = load_config(config_file_path)
-else:
-    config = {
-        'resolutions': ['3840x2160', '1920x1080', '1300x1300'], 
-        'default_colours': ['#f0991a', '#820000', '#32f01a', '#af1af0', '#016795'], 
-        'title_presets': ['CPU Scores', 'GPU Scores'], 
-        'sub_title_presets': ['Higher scores indicate higher performance', 'Lower scores indicate higher performance']
-        }
-    save_config(config, config_file_path)
+# Load the current configuration, parsed once per process and re-read when it changes
+config = startup.load_config(config_file_path)
+if config is None:
+    config = startup.DEFAULT_CONFIG
+    startup.save_config(config, config_file_path)
+
+# Imports, gradient tables and font caches are warmed up while the user picks a file.
+# The render workers are only started by the first full render.
+startup.warm_up_in_background(config)
 
 
 st.set_page_config(
@@ -43,10 +34,23 @@ st.set_page_config(
 
 st.title("Chart Generator")
 
+timer = profiling.StageTimer()
+
 uploaded_file = st.file_uploader("Choose a CSV file", type="csv")
 
 if uploaded_file is not None:
-    df = pd.read_csv(uploaded_file)
+    import chart
+    import export
+    import large_data
+    import render_cache
+    import render_queue
+    import text_fit
+    import upload_cache
+
+    render_service = render_queue.default_service(config['default_colours'])
+
+    with timer.stage("parse"):
+        df = upload_cache.read_csv(uploaded_file)
 
 
     preview = st.checkbox("Show Preview")
@@ -103,13 +107,27 @@ if uploaded_file is not None:
     elif score_cols == 4:
         bar_width = col2.slider("Bar Thickness", min_value=0.1, value=0.1, step=0.05)
 
-    #Font Size
-    if 'subheading' in df:
-        longest_string = max(df["heading"].str.len().max(), df["subheading"].str.len().max())
+    # Size Selector
+    size = col1.selectbox("Chart Size", config['resolutions'])
+
+    # Large CSVs: the top rows plus an "Others" row, or the rows split over pages, so
+    # each render only lays out what is visible. Chosen here, the axis font below is
+    # fitted to the rows each chart shows.
+    layout = "All Rows"
+    if len(df) > large_data.LARGE_ROWS:
+        layout = col1.selectbox("Layout", ("Top N", "Pages", "All Rows"))
+    if layout == "Top N":
+        rows_shown = col1.number_input("Rows Shown", min_value=1, max_value=len(df), value=large_data.TOP_N)
+        fit_rows = rows_shown + 1
+    elif layout == "Pages":
+        rows_per_page = col1.number_input("Rows Per Page", min_value=1, max_value=len(df), value=large_data.ROWS_PER_PAGE)
+        fit_rows = rows_per_page
     else:
-        longest_string = df["heading"].str.len().max()
+        fit_rows = len(df)
 
-    tick_default_size = math.floor(map(longest_string, 1, 30, 30, 5))
+    #Font Size
+    # Largest axis font at which the measured labels fit, so the first render fits
+    tick_default_size = text_fit.axis_font_size(df, size, fit_rows)
 
     title_font_size = col2.slider("Title Font Size", min_value=10, max_value=50, value=30, step=1)
     subtitle_font_size = col2.slider("Sub Title Font Size", min_value=5, max_value=50, value=15, step=1)
@@ -125,9 +143,6 @@ if uploaded_file is not None:
     # Bar Score Position
     bar_score_offset = col2.slider("Bar Score Position", min_value=0, max_value=200, value=110, step=1)
 
-    # Size Selector
-    size = col1.selectbox("Chart Size", config['resolutions'])
-
     # Sorted Selector
     cols = list(df.columns.values)
     cols.insert(0, "None")
@@ -161,39 +176,130 @@ if uploaded_file is not None:
     highlight_color = st.color_picker("Highlight Colour", default_cols[5], disabled=highlight_color_disabled)
 
 
-    filename = 'output.png'
+    spec = chart.ChartSpec(size=size,
+                           bg_color=bg_color,
+                           sorted_col=sorted_col,
+                           is_ascending=is_ascending,
+                           highlight=highlight_col,
+                           colours=colours,
+                           highlight_color=highlight_color,
+                           bar_width=bar_width,
+                           bar_score_offset=bar_score_offset,
+                           title_font_size=title_font_size,
+                           subtitle_font_size=subtitle_font_size,
+                           axis_font_size=axis_font_size,
+                           legend_font_size=legend_font_size,
+                           bar_data_font_size=bar_data_font_size,
+                           title=title,
+                           x_title_pos=x_title_pos,
+                           y_title_pos=y_title_pos,
+                           sub_text=sub_text,
+                           legend_text=legend)
+    render_args = spec.params()
+
+    # The layout chosen above
+    if layout == "Top N":
+        df = large_data.top_n(df, rows_shown, sorted_col, is_ascending, keep=[highlight_col])
+        render_args['sorted_col'] = "None"
+    elif layout == "Pages":
+        pages, render_args = large_data.paged(df, rows_per_page, **render_args)
+        page_number = col1.number_input(f"Page (of {len(pages)})", min_value=1, max_value=len(pages), value=1)
+        df = pages[page_number-1]
+
+    # Opt-in timings and artist counts from inside the renderer, for the Profiling panel
+    profile_renders = st.toggle("Profile Renders")
+    include_cprofile = profile_renders and st.checkbox("Include cProfile")
+    render_profile = profiling.StageTimer() if profile_renders else None
+
+    # Low resolution preview on every change, same layout as the full render
+    live_preview = st.toggle("Live Preview", value=True)
+    if live_preview:
+        render_cache.show_preview(st, "preview_chart", df, timer=timer, render_profile=render_profile,
+                                  include_cprofile=include_cprofile, **render_args)
+
+    # Full resolution only on request
+    export_format = st.selectbox("Download Format", list(export.FORMATS))
+
+    # Renders run in the render pool, not on this script thread. While the page waits it
+    # keeps polling Streamlit, so changing a setting reruns it at once and the job for
+    # the old settings is cancelled.
+    cache = render_cache.default_cache()
+    render_key = render_queue.render_key(df, render_args, export_format)
+    job = st.session_state.get("render_job")
+    if job is not None and job.key != render_key and not job.done():
+        render_service.cancel(job)
+
     if st.button("Generate Chart"):
-        chart.generate_chart(df, 
-                            filename, 
-                            size, 
-                            bg_color, 
-                            sorted_col, 
-                            is_ascending, 
-                            highlight_col, 
-                            colours, 
-                            highlight_color, 
-                            bar_width, 
-                            bar_score_offset, 
-                            title_font_size, 
-                            subtitle_font_size,
-                            axis_font_size, 
-                            legend_font_size,
-                            bar_data_font_size,
-                            title, 
-                            x_title_pos, 
-                            y_title_pos, 
-                            sub_text, 
-                            legend
-                            )
-        image = imread(filename)
-        st.image(image)
-        with open(filename, "rb") as file:
-            btn = st.download_button(
-                label="Download chart",
-                data=file,
-                file_name=title,
-                mime="image/png",
-            )
+        st.session_state["render_request"] = render_key
+
+    if st.session_state.get("render_request") == render_key:
+        png = cache.get(cache.key(df, render_args))
+        data = png if export_format == "PNG" else cache.get(render_key)
+        if png is None or data is None:
+            if job is not None and job.key == render_key and job.superseded and not job.future.cancelled():
+                # Back to settings whose job was superseded while it was already rendering
+                job.superseded = False
+            if job is None or job.key != render_key or job.future.cancelled():
+                # A job cancelled while queued never runs, so coming back to its
+                # settings needs a new one
+                job = render_service.submit(df, render_args, export_format, profile=profile_renders,
+                                             cprofile=include_cprofile, key=render_key)
+                st.session_state["render_job"] = job
+            status = st.empty()
+            with timer.stage("render"):
+                while not job.done():
+                    stats = render_service.stats()
+                    status.caption(f"Rendering: {job.state()}, {stats['queued']} queued and {stats['running']} running on {stats['workers']} workers")
+                    time.sleep(render_queue.POLL_SECONDS)
+            status.empty()
+            try:
+                result = job.result()
+            except CancelledError:
+                # Not a failure: cancelled by another run of this page, the next run
+                # submits it again
+                st.rerun()
+            except Exception as error:
+                st.error("Render failed: " + str(error))
+                st.stop()
+            png, data = result['png'], result['data']
+            if render_profile is not None and result['profile'] is not None:
+                render_profile.merge(result['profile'])
+                if result['profile_stats'] is not None:
+                    render_profile.add_profile_bytes(result['profile_stats'])
+        st.image(png)
+        stats = cache.stats()
+        st.caption(f"Render cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries ({stats['bytes']/1e6:.1f} MB)")
+        queue = render_service.stats()
+        if queue['median_latency'] is not None:
+            st.caption(f"Render queue: {queue['queued']} queued, {queue['running']} running, {queue['completed']} done, {queue['cancelled']} cancelled, "
+                       f"median {queue['median_latency']*1000:.0f} ms per job ({queue['median_wait']*1000:.0f} ms waiting) over the last {render_queue.LATENCY_WINDOW}")
+        btn = st.download_button(
+            label="Download chart",
+            data=data,
+            file_name=title + "." + export.extension(export_format),
+            mime=export.mime_type(export_format),
+        )
+
+    # Every page at full resolution, as one PDF or a zip of images in the download format
+    if layout == "Pages":
+        all_pages_format = st.selectbox("All Pages As", ("PDF", "Zip of " + export_format))
+        if st.button("Generate All Pages"):
+            with timer.stage("pages"), profiling.recording(render_profile, include_cprofile):
+                if all_pages_format == "PDF":
+                    data = large_data.render_pdf(pages, render_args)
+                    file_name, mime = title + ".pdf", "application/pdf"
+                else:
+                    buffer = io.BytesIO()
+                    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+                        for i, page in enumerate(large_data.render_pages(pages, render_args, export_format)):
+                            archive.writestr(f"{title} {i+1}.{export.extension(export_format)}", page)
+                    data = buffer.getvalue()
+                    file_name, mime = title + ".zip", "application/zip"
+            st.download_button(label="Download all pages", data=data, file_name=file_name, mime=mime)
+
+    st.caption("This run: " + timer.summary())
+
+    profiling.show_panel(st, timer, render_profile)
 else:
     st.write("Waiting on file upload...")
 
@@ -0,0 +1,101 @@
+import pandas as pd
+
+# FrameView column behind each score column, in the order the charts expect them
+METRICS = {
+    'score_min_fps': '1% FPS',
+    'score_avg_fps': 'Avg FPS',
+    'score_pwr_agv': 'PCAT Power (Watts)',
+}
+
+# Only these columns are ever read from a log, with compact dtypes
+COLUMNS = ['Resolution', 'GPU0'] + list(METRICS.values())
+DTYPES = {'Resolution': 'category', 'GPU0': 'category', **{column: 'float32' for column in METRICS.values()}}
+
+CHUNK_ROWS = 250_000
+
+OUTPUT_COLUMNS = ['Resolution', 'score_min_fps', 'score_avg_fps', 'score_pwr_agv', 'score_avg_fps_watt', 'heading', 'source']
+
+# Chart type: (score columns shown, default sort column, file name without extension)
+CHART_TYPES = {
+    'FPS': (['score_min_fps', 'score_avg_fps'], 'score_avg_fps', "FPS Chart"),
+    'Power': (['score_pwr_agv'], 'score_pwr_agv', "PWR Chart"),
+    'FPS per Watt': (['score_avg_fps_watt'], 'score_avg_fps_watt', "FPS per Watt Chart"),
+}
+
+
+def read_frameview(file, chunksize=None):
+    # With chunksize this returns an iterator of DataFrames instead of one DataFrame
+    return pd.read_csv(file, usecols=COLUMNS, dtype=DTYPES, chunksize=chunksize)
+
+
+def summarize_runs(frames, runs):
+    # Running totals per (run, Resolution): a sum and count per metric plus the GPU
+    # name. Totals from different chunks or files can be added together later.
+    columns = ['Resolution', 'GPU0'] + list(METRICS.values())
+    combined = pd.concat([frame[columns] for frame in frames], keys=list(runs), names=['run', None])
+
+    summary = combined.groupby(['run', 'Resolution'], sort=True, observed=True).agg(
+        **{score + '_sum': (column, 'sum') for score, column in METRICS.items()},
+        **{score + '_count': (column, 'count') for score, column in METRICS.items()},
+        heading=('GPU0', 'first'),
+    )
+    return _plain_summary(summary)
+
+
+def _plain_summary(summary):
+    # float64 totals and string keys, so summaries from chunks with different
+    # categories or float32 inputs merge cleanly
+    summary = summary.reset_index()
+    summary['Resolution'] = summary['Resolution'].astype(str)
+    summary['heading'] = summary['heading'].astype(str)
+    for score in METRICS:
+        summary[score + '_sum'] = summary[score + '_sum'].astype('float64')
+    return summary.set_index(['run', 'Resolution'])
+
+
+def merge_summaries(summaries):
+    combined = pd.concat(summaries)
+    totals = {column: 'sum' for column in combined.columns if column != 'heading'}
+    return combined.groupby(level=['run', 'Resolution'], sort=True).agg({**totals, 'heading': 'first'})
+
+
+def stream_summary(file, run, chunksize=CHUNK_ROWS):
+    # Reads a log chunk by chunk and folds each chunk into the running totals, so
+    # peak memory depends on chunksize rather than on the size of the log
+    summary = None
+    for chunk in read_frameview(file, chunksize=chunksize):
+        part = summarize_runs([chunk], [run])
+        summary = part if summary is None else merge_summaries([summary, part])
+    return summary
+
+
+def finish_runs(summaries, names):
+    summary = merge_summaries([summary for summary in summaries if summary is not None])
+
+    result = pd.DataFrame(index=summary.index)
+    for score in METRICS:
+        result[score] = (summary[score + '_sum'] / summary[score + '_count']).round(1)
+    result['score_avg_fps_watt'] = (result['score_avg_fps'] / result['score_pwr_agv']).round(2)
+    result['heading'] = summary['heading']
+
+    result = result.reset_index()
+    result['source'] = [names[run] for run in result['run']]
+    return result[OUTPUT_COLUMNS]
+
+
+def aggregate_runs(frames, names=None):
+    # Per run and resolution averages of every metric, laid out as score_* columns for
+    # chart.generate_chart. All runs are concatenated once and reduced in one groupby
+    # instead of four groupbys and a growing concat per file.
+    if names is None:
+        names = [str(i) for i in range(len(frames))]
+    return finish_runs([summarize_runs(frames, range(len(frames)))], names)
+
+
+def chart_frame(final_df, chart_type):
+    # finish_runs output cut down to the score columns of one chart type. source is only
+    # for the table: the renderer offsets each bar group by its column position, so any
+    # extra column would move the bars off their tick labels.
+    shown = CHART_TYPES[chart_type][0]
+    return final_df.drop(columns=[column for column in final_df.columns
+                                  if column == 'source' or (column.startswith('score_') and column not in shown)])
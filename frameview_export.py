@@ -0,0 +1,92 @@
+# Export all: every Resolution x chart type of one aggregated FrameView table, rendered
+# on the shared render pool and packed into a single zip.
+import io
+import logging
+import zipfile
+from concurrent.futures import CancelledError, as_completed
+
+import batch_render
+import export
+import frameview_data
+import render_queue
+
+logger = logging.getLogger(__name__)
+
+
+def chart_params(df, params, source_columns, chart_type):
+    # params are the page's generate_chart arguments, set up for a DataFrame with
+    # source_columns. Carries the colours (in order), legend texts (by column name) and
+    # the rest of the styling over to df, which may show other score columns.
+    colour_values = list(params['colours'].values())
+    legend_by_column = {source_columns[int(key[3:])]: text for key, text in params['legend_text'].items()}
+
+    colours = {}
+    legend = {}
+    col_index = 0
+    for i, column in enumerate(df.columns):
+        if column.startswith("score_"):
+            colours["col"+str(i)] = colour_values[col_index % len(colour_values)]
+            legend["col"+str(i)] = legend_by_column.get(column, column.split("_")[1])
+            col_index = col_index + 1
+
+    sorted_col = params['sorted_col']
+    if sorted_col != "None" and sorted_col not in df.columns:
+        sorted_col = frameview_data.CHART_TYPES[chart_type][1]
+
+    bar_width = params['bar_width']
+    if col_index != sum(column.startswith("score_") for column in source_columns):
+        bar_width = batch_render.BAR_WIDTHS.get(col_index, 0.1)
+
+    return dict(params, colours=colours, legend_text=legend, sorted_col=sorted_col, bar_width=bar_width)
+
+
+def build_jobs(final_df, params, source_columns, format="PNG", chart_types=None):
+    if chart_types is None:
+        chart_types = list(frameview_data.CHART_TYPES)
+
+    jobs = []
+    for resolution in final_df["Resolution"].unique():
+        resolution_df = final_df[final_df["Resolution"] == resolution]
+        for chart_type in chart_types:
+            df = frameview_data.chart_frame(resolution_df, chart_type)
+            name = frameview_data.CHART_TYPES[chart_type][2]
+            jobs.append({
+                'name': f"{resolution}/{name}.{export.extension(format)}",
+                'df': df,
+                'params': chart_params(df, params, source_columns, chart_type),
+                'format': format,
+            })
+    return jobs
+
+
+def export_all(final_df, params, source_columns, format="PNG", service=None):
+    # Returns the zip as bytes and a list of {'name', 'seconds', 'bytes'} per chart.
+    # Charts that fail are logged and left out of the zip. The jobs go to service, by
+    # default the render_queue pool the pages share, whose workers are already warm
+    # after the first render.
+    if service is None:
+        service = render_queue.default_service(list(params['colours'].values()))
+    jobs = build_jobs(final_df, params, source_columns, format)
+    results = {}
+    timings = []
+    futures = {service.submit(job['df'], job['params'], job['format'], with_png=False).future: job for job in jobs}
+    for future in as_completed(futures):
+        job = futures[future]
+        try:
+            result = future.result()
+        except (Exception, CancelledError) as error:
+            logger.warning("FAILED %s: %s", job['name'], error)
+            continue
+        results[job['name']] = result['data']
+        seconds = result['finished'] - result['started']
+        timings.append({'name': job['name'], 'seconds': seconds, 'bytes': len(result['data'])})
+        logger.info("%7.2fs  %8.1f kB  %s", seconds, len(result['data'])/1e3, job['name'])
+
+    # Already compressed images, so stored rather than deflated; job order keeps the
+    # archive listing stable whatever order the workers finish in
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for job in jobs:
+            if job['name'] in results:
+                archive.writestr(job['name'], results[job['name']])
+    return buffer.getvalue(), sorted(timings, key=lambda timing: timing['name'])
@@ -0,0 +1,93 @@
+# Layouts for CSVs with more rows than fit on one chart: the top N rows plus an
+# "Others" row, or the rows split over several pages (separate images or one PDF).
+# Each page only draws its own rows, so bar labels, tick labels and the legend's
+# placement cost the same whatever the size of the file.
+import io
+
+import pandas as pd
+
+import chart
+import export
+
+# Above this many rows the pages offer the large-dataset layouts
+LARGE_ROWS = 50
+TOP_N = 20
+ROWS_PER_PAGE = 25
+
+
+def sort_rows(df, sorted_col, is_ascending):
+    if sorted_col == "None":
+        return df
+    return df.sort_values(by=[sorted_col], ascending=is_ascending)
+
+
+def score_columns(df):
+    return [column for column in df.columns if column.startswith("score_")]
+
+
+def top_n(df, n, sorted_col, is_ascending, keep=()):
+    # The first n rows in chart order plus one row averaging the rest. Rows whose
+    # heading is in keep (e.g. the highlighted one) stay even when they fall outside
+    # the top n. The result is already in order, render it with sorted_col="None".
+    df = sort_rows(df, sorted_col, is_ascending)
+    rest = df.iloc[n:]
+    kept = rest['heading'].isin(list(keep))
+    shown = pd.concat([df.iloc[:n], rest[kept]])
+    rest = rest[~kept]
+    if rest.empty:
+        return shown
+
+    others = {column: "" for column in df.columns}
+    others['heading'] = f"Others ({len(rest)})"
+    for column in score_columns(df):
+        others[column] = round(rest[column].mean(), 1)
+    return pd.concat([shown, pd.DataFrame([others])], ignore_index=True)
+
+
+def paginate(df, rows_per_page, sorted_col, is_ascending):
+    # Sorted once over the whole file, then cut into pages. Pages are in order, render
+    # them with sorted_col="None" and the same x_max so they share one scale.
+    df = sort_rows(df, sorted_col, is_ascending)
+    return [df.iloc[start:start + rows_per_page] for start in range(0, len(df), rows_per_page)]
+
+
+def x_max(df):
+    return float(df[score_columns(df)].max().max())
+
+
+def paged(df, rows_per_page, *args, **kwargs):
+    # The pages of df and the generate_chart arguments (minus filename) that render
+    # each of them: already in order, on one shared scale
+    params = chart.bind_params(*args, **kwargs)
+    pages = paginate(df, rows_per_page, params['sorted_col'], params['is_ascending'])
+    return pages, dict(params, sorted_col="None", x_max=x_max(df))
+
+
+def render_pages(pages, params, format="PNG"):
+    # pages and params as paged() returns them, gives the bytes of every page in one
+    # of export.FORMATS
+    if format != "PNG":
+        return [export.export_chart(page, format=format, **params) for page in pages]
+
+    # One chart for every page, later pages only swap the data artists
+    template = chart.ChartTemplate(**params)
+    try:
+        return [template.render_bytes(page) for page in pages]
+    finally:
+        template.close()
+
+
+def render_pdf(pages, params):
+    # Every page in one PDF. The PDF backend is only imported when one is asked for.
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    buffer = io.BytesIO()
+    session = chart.Chart()
+    try:
+        with PdfPages(buffer) as pdf:
+            for page in pages:
+                session.update(page, **params)
+                pdf.savefig(session.fig)
+    finally:
+        session.close()
+    return buffer.getvalue()
@@ -1,38 +1,28 @@
 import streamlit as st
-import pandas as pd
-from matplotlib.image import imread
 
-import yaml
 import os
-import math
 
-import chart
+import profiling
+import startup
 
-def map(number, inMin, inMax, outMin, outMax):
-    return (number - inMin) * (outMax - outMin) / (inMax - inMin) + outMin
+# pandas and pyarrow are only imported once the uploader is showing, matplotlib and the
+# renderer once there are runs to chart (and usually already loaded by then, see
+# warm_up_in_background below)
+startup.use_agg()
 
-def load_config(file_path):
-    with open(file_path, 'r') as file:
-        config = yaml.safe_load(file)
-    return config
+config_file_path = 'config.yaml'
 
-def save_config(config, file_path):
-    with open(file_path, 'w') as file:
-        yaml.dump(config, file, default_flow_style=False)
+# Uploads above this size are aggregated in chunks
+LARGE_FILE_BYTES = 50 * 1024 * 1024
 
-config_file_path = 'config.yaml'
+# Load the current configuration, parsed once per process and re-read when it changes
+config = startup.load_config(config_file_path)
+if config is None:
+    config = startup.DEFAULT_CONFIG
+    startup.save_config(config, config_file_path)
 
-# Load the current configuration
-if os.path.exists(config_file_path):
-    config = load_config(config_file_path)
-else:
-    config = {
-        'resolutions': ['3840x2160', '1920x1080', '1300x1300'], 
-        'default_colours': ['#f0991a', '#820000', '#32f01a', '#af1af0', '#016795'], 
-        'title_presets': ['CPU Scores', 'GPU Scores'], 
-        'sub_title_presets': ['Higher scores indicate higher performance', 'Lower scores indicate higher performance']
-        }
-    save_config(config, config_file_path)
+# Imports, gradient tables and font caches are warmed up while the user picks files
+startup.warm_up_in_background(config)
     
 
 st.set_page_config(
@@ -43,44 +33,111 @@ st.set_page_config(
 
 st.title("Frameview Generator")
 
+timer = profiling.StageTimer()
+
 uploaded_files = st.file_uploader("Choose first CSV file", type="csv", accept_multiple_files=True)
 
+# Every parsed run is kept on disk, so runs from earlier sessions can be charted
+# again without uploading them. Listed after the uploader is drawn, the store and the
+# upload cache bring in pandas and pyarrow.
+import pandas as pd
+
+import run_store
+import upload_cache
+
+store = run_store.default_store()
+uploaded_digests = {upload_cache.digest(uploaded_file) for uploaded_file in uploaded_files}
+stored_runs = [meta for meta in store.runs() if meta['key'] not in uploaded_digests]
+with st.expander("Stored Runs (" + str(len(stored_runs)) + ")"):
+    stored_labels = {}
+    for meta in stored_runs:
+        stored_labels[meta['key']] = meta['name'] + " · " + pd.Timestamp(meta['stored'], unit='s').strftime("%Y-%m-%d %H:%M")
+    st.dataframe(pd.DataFrame({
+        'File': [meta['name'] for meta in stored_runs],
+        'Resolutions': [", ".join(meta['resolutions']) for meta in stored_runs],
+        'Rows': [meta['rows'] for meta in stored_runs],
+        'MB': [round(meta['bytes']/1e6, 1) for meta in stored_runs],
+        'Stored': [pd.Timestamp(meta['stored'], unit='s') for meta in stored_runs],
+    }), hide_index=True)
+    stored_selection = st.multiselect("Add Stored Runs", list(stored_labels), format_func=lambda key: stored_labels[key])
+
 final_df = None
 
 print(uploaded_files)
 
-if uploaded_files != []:
+if uploaded_files != [] or stored_selection:
+    import chart
+    import export
+    import frameview_data
+    import frameview_export
+    import render_cache
+    import render_queue
+    import text_fit
+
     data_array = []
+    # Every file is read, checked and summarized on a thread pool first; the widgets
+    # below then only show the results
+    progress_bar = st.progress(0.0)
+    def report(done, total, result):
+        progress_bar.progress(done/total, text=f"Read {result['name']} ({done}/{total})")
+
+    with timer.stage("parse"):
+        ingested = upload_cache.ingest_frameview(uploaded_files, LARGE_FILE_BYTES, progress=report, store=store)
+        ingested += upload_cache.load_stored(stored_selection, store, first_run=len(ingested))
+    progress_bar.empty()
+
     # with st.form("FormTest"):
-    for i in range(len(uploaded_files)):
-        df = pd.read_csv(uploaded_files[i])
+    for i in range(len(ingested)):
+        if ingested[i]['error'] is not None:
+            st.error("Could not read " + ingested[i]['name'] + ": " + ingested[i]['error'])
+            data_array.append(None)
+            continue
+
+        # Big per-frame captures are folded into running totals chunk by chunk
+        # instead of being loaded whole, so they skip the preview and row exclusion
+        if ingested[i]['df'] is None:
+            data_array.append(None)
+            st.caption(ingested[i]['name'] + " is large, streamed without preview or row exclusion")
+            continue
+
+        df = ingested[i]['df']
 
         data_array.append(df)
         
-        preview = st.checkbox("Show Preview for " + uploaded_files[i].name)
+        preview = st.checkbox("Show Preview for " + ingested[i]['name'])
         if preview:
             st.subheader("Data Preview")
             st.write(df)
 
 
-        locals()["exclude_"+str(i)] = st.multiselect("Exclude Rows " + uploaded_files[i].name, list(df.index.values), on_change=None)
+        locals()["exclude_"+str(i)] = st.multiselect("Exclude Rows " + ingested[i]['name'], list(df.index.values), on_change=None)
 
          
-    final_df = pd.DataFrame()    
-    for i in range(len(data_array)):
-        exclude_list = eval("exclude_"+str(i))
-        data_array[i] = data_array[i].drop(index=exclude_list)
-        # st.write(data_array[i])
-        min_fps = data_array[i].groupby('Resolution')['1% FPS'].mean().round(1)
-        avg_fps = data_array[i].groupby('Resolution')['Avg FPS'].mean().round(1)
-        pwr_agv = data_array[i].groupby('Resolution')['PCAT Power (Watts)'].mean().round(1)
-        avg_fps_watt = round(avg_fps / pwr_agv, 2)
-        
-        temp_df = pd.concat([min_fps, avg_fps, pwr_agv, avg_fps_watt], keys=['score_min_fps', 'score_avg_fps', 'score_pwr_agv', 'score_avg_fps_watt'], axis=1).reset_index()
-
-        temp_df = temp_df.assign(heading=data_array[i]['GPU0'])
-        final_df = pd.concat([final_df, temp_df])
-
+    runs = [i for i in range(len(ingested)) if ingested[i]['error'] is None]
+    if not runs:
+        st.stop()
+
+    def aggregate():
+        summaries = []
+        for i in runs:
+            exclude_list = eval("exclude_"+str(i)) if data_array[i] is not None else []
+            if exclude_list:
+                summaries.append(frameview_data.summarize_runs([data_array[i].drop(index=exclude_list)], [i]))
+            else:
+                summaries.append(ingested[i]['summary'])
+        return frameview_data.finish_runs(summaries, [result['name'] for result in ingested])
+
+    # Same files, names and exclusions as a previous run give the same table
+    aggregate_key = []
+    for i in runs:
+        exclude_list = tuple(eval("exclude_"+str(i))) if data_array[i] is not None else ()
+        aggregate_key.append((ingested[i]['digest'], ingested[i]['name'], exclude_list))
+
+    with timer.stage("aggregate"):
+        final_df = upload_cache.aggregate(tuple(aggregate_key), aggregate)
+
+    # Every resolution, kept for Export All
+    all_df = final_df
 
     res_selection = st.selectbox(
                     "Resolution", 
@@ -90,25 +147,17 @@ if uploaded_files != []:
 
     final_df = final_df[final_df["Resolution"] == res_selection]
 
-    fps_df = final_df.drop(columns=['score_pwr_agv', 'score_avg_fps_watt'])
-    pwr_df = final_df.drop(columns=['score_min_fps','score_avg_fps', 'score_avg_fps_watt'])
-
             
     st.write(final_df)
 
     chart_selection = st.selectbox(
                     "Chart Type", 
-                    ("FPS", "Power")
+                    list(frameview_data.CHART_TYPES)
                 )
 
-    if chart_selection == "FPS":
-        filename = "FPS Chart.png"
-        df = fps_df
-        sort = 'score_avg_fps'
-    else:
-        filename = "PWR Chart.png"
-        df = pwr_df
-        sort = 'score_pwr_agv'
+    df = frameview_data.chart_frame(final_df, chart_selection)
+    sort = frameview_data.CHART_TYPES[chart_selection][1]
+    filename = frameview_data.CHART_TYPES[chart_selection][2] + ".png"
 
 
     # -----------------------------------------Config Options--------------------------------------------------------------------
@@ -162,13 +211,12 @@ if uploaded_files != []:
     elif score_cols == 4:
         bar_width = col2.slider("Bar Thickness", min_value=0.1, value=0.1, step=0.05)
 
-    #Font Size
-    if 'subheading' in df:
-        longest_string = max(df["heading"].str.len().max(), df["subheading"].str.len().max())
-    else:
-        longest_string = df["heading"].str.len().max()
+    # Size Selector
+    size = col1.selectbox("Chart Size", config['resolutions'])
 
-    tick_default_size = math.floor(map(longest_string, 1, 30, 30, 5))
+    #Font Size
+    # Largest axis font at which the measured labels fit, so the first render fits
+    tick_default_size = text_fit.axis_font_size(df, size)
 
     title_font_size = col2.slider("Title Font Size", min_value=10, max_value=50, value=30, step=1)
     subtitle_font_size = col2.slider("Sub Title Font Size", min_value=5, max_value=50, value=15, step=1)
@@ -184,9 +232,6 @@ if uploaded_files != []:
     # Bar Score Position
     bar_score_offset = col2.slider("Bar Score Position", min_value=0, max_value=200, value=110, step=1)
 
-    # Size Selector
-    size = col1.selectbox("Chart Size", config['resolutions'])
-
     # Sorted Selector
     cols = list(df.columns.values)
     cols.insert(0, "None")
@@ -221,39 +266,73 @@ if uploaded_files != []:
 
 
 
+    spec = chart.ChartSpec(size=size,
+                           bg_color=bg_color,
+                           sorted_col=sorted_col,
+                           is_ascending=is_ascending,
+                           highlight=highlight_col,
+                           colours=colours,
+                           highlight_color=highlight_color,
+                           bar_width=bar_width,
+                           bar_score_offset=bar_score_offset,
+                           title_font_size=title_font_size,
+                           subtitle_font_size=subtitle_font_size,
+                           axis_font_size=axis_font_size,
+                           legend_font_size=legend_font_size,
+                           bar_data_font_size=bar_data_font_size,
+                           title=title,
+                           x_title_pos=x_title_pos,
+                           y_title_pos=y_title_pos,
+                           sub_text=sub_text,
+                           legend_text=legend)
+
+    # Opt-in timings and artist counts from inside the renderer, for the Profiling panel
+    profile_renders = st.toggle("Profile Renders")
+    include_cprofile = profile_renders and st.checkbox("Include cProfile")
+    render_profile = profiling.StageTimer() if profile_renders else None
+
+    # Low resolution preview on every change, same layout as the full render
+    live_preview = st.toggle("Live Preview", value=True)
+    if live_preview:
+        render_cache.show_preview(st, "frameview_preview_chart", df, spec, timer=timer, render_profile=render_profile,
+                                  include_cprofile=include_cprofile)
+
+    # Full resolution only on request
+    export_format = st.selectbox("Download Format", list(export.FORMATS))
+
     if st.button("Generate Chart"):
-        filename = "FPS Chart.png"
-        chart.generate_chart(df, 
-                            filename, 
-                            size, 
-                            bg_color, 
-                            sorted_col, 
-                            is_ascending, 
-                            highlight_col, 
-                            colours, 
-                            highlight_color, 
-                            bar_width, 
-                            bar_score_offset, 
-                            title_font_size, 
-                            subtitle_font_size,
-                            axis_font_size, 
-                            legend_font_size,
-                            bar_data_font_size,
-                            title, 
-                            x_title_pos, 
-                            y_title_pos, 
-                            sub_text, 
-                            legend
-                            )
-        image = imread(filename)
-        st.image(image)
-        with open(filename, "rb") as file:
-            btn = st.download_button(
-                label="Download chart",
-                data=file,
-                file_name=filename,
-                mime="image/png",
-            )
+        with timer.stage("render"), profiling.recording(render_profile, include_cprofile):
+            png = render_cache.generate_chart_bytes(df, spec)
+        st.image(png)
+        data = png
+        if export_format != "PNG":
+            with timer.stage("export"), profiling.recording(render_profile, include_cprofile):
+                data = render_cache.generate_chart_bytes(df, spec, format=export_format)
+        stats = render_cache.default_cache().stats()
+        st.caption(f"Render cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries ({stats['bytes']/1e6:.1f} MB)")
+        btn = st.download_button(
+            label="Download chart",
+            data=data,
+            file_name=os.path.splitext(filename)[0] + "." + export.extension(export_format),
+            mime=export.mime_type(export_format),
+        )
+
+    # Every resolution x chart type with these settings, as one zip
+    if st.button("Export All"):
+        with timer.stage("export all"):
+            archive, timings = frameview_export.export_all(all_df, spec.params(), list(df.columns), format=export_format,
+                                                           service=render_queue.default_service(config['default_colours']))
+        st.dataframe(pd.DataFrame(timings), hide_index=True)
+        st.download_button(
+            label="Download all charts",
+            data=archive,
+            file_name="FrameView Charts.zip",
+            mime="application/zip",
+        )
+
+    st.caption("This run: " + timer.summary())
+
+    profiling.show_panel(st, timer, render_profile)
 
 else:
     st.write("Waiting on file upload...")
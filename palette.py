@@ -0,0 +1,90 @@
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import matplotlib.colors as mcolors
+import numpy as np
+
+# Gradients are looked up from tables of this many colours (see chart.CompoundGradient)
+STEPS = 256
+MAX_ENTRIES = 64
+
+
+@lru_cache(maxsize=1024)
+def hex_to_rgb(hex):
+    hex = hex.replace("#", "")
+    rgb = []
+    for i in (0, 2, 4):
+        decimal = int(hex[i:i+2], 16)
+        rgb.append(decimal/255)
+
+    return tuple(rgb)
+
+
+def adjust_brightness(color, factor):
+    return tuple(min(1, max(0, c * factor)) for c in color)
+
+
+def gradient_stops(rgb):
+    # Left to right from 20% brighter to 20% darker than the colour
+    return [adjust_brightness(rgb, 1.2), adjust_brightness(rgb, 0.8)]
+
+
+def gradient_colormap(rgb, name):
+    return mcolors.LinearSegmentedColormap.from_list(name, gradient_stops(rgb), N=STEPS)
+
+
+class PaletteRegistry:
+    # Gradient colormap and its STEPS x 4 uint8 lookup table per hex colour, built once
+    # and shared by every render in the process. Least recently used colours are dropped
+    # once max_entries is reached. The tables are read-only, copy before changing them.
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def _entry(self, hex):
+        key = hex.lower()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        colmap = gradient_colormap(hex_to_rgb(key), key)
+        lut = colmap(np.linspace(0, 1, STEPS), bytes=True)
+        lut.flags.writeable = False
+        entry = (colmap, lut)
+
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def colormap(self, hex):
+        return self._entry(hex)[0]
+
+    def lut(self, hex):
+        return self._entry(hex)[1]
+
+    def seed(self, hex_colours):
+        for hex in hex_colours:
+            self._entry(hex)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+registry = PaletteRegistry()
+
+
+def seed_from_config(config):
+    # Warm the registry with the palette offered in the UI / used by batch jobs
+    registry.seed(config.get('default_colours', []))
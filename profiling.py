@@ -0,0 +1,153 @@
+import cProfile
+import functools
+import json
+import marshal
+import pstats
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+# The timer stage() and count() report to, set by recording(). Per thread / task, so
+# concurrent renders never mix their numbers.
+_active = ContextVar("profiling_timer", default=None)
+
+
+class StageTimer:
+    # Wall time per named stage of one script run / render. Re-entering a stage adds to it.
+
+    def __init__(self):
+        self.stages = OrderedDict()
+        self.counts = OrderedDict()
+        self.stats = None
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def total(self):
+        return sum(self.stages.values())
+
+    def summary(self):
+        parts = [f"{name} {seconds*1000:.1f} ms" for name, seconds in self.stages.items()]
+        return " · ".join(parts) if parts else "nothing timed"
+
+    def add_profile(self, profiler):
+        if self.stats is None:
+            self.stats = pstats.Stats(profiler)
+        else:
+            self.stats.add(profiler)
+
+    def add_profile_bytes(self, data):
+        # profile_bytes() of another timer, e.g. one that profiled a render in a worker
+        # process
+        stats = pstats.Stats()
+        stats.stats = marshal.loads(data)
+        stats.get_top_level_stats()
+        if self.stats is None:
+            self.stats = stats
+        else:
+            self.stats.add(stats)
+
+    def to_dict(self):
+        return {
+            'stages': {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            'counts': dict(self.counts),
+        }
+
+    def merge(self, data):
+        # Adds the stages and counts of another timer's to_dict(), e.g. one that recorded
+        # a render in a worker process
+        for name, seconds in data['stages'].items():
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+        self.counts.update(data['counts'])
+
+    def profile_bytes(self):
+        # cProfile output in the format pstats.Stats, snakeviz and friends read, or None
+        # when nothing was profiled
+        if self.stats is None:
+            return None
+        return marshal.dumps(self.stats.stats)
+
+
+@contextmanager
+def recording(timer, profile=False):
+    # Sends every stage() and artist count inside the block, including the ones in
+    # chart.py, to timer. profile=True also runs cProfile over the block. A None timer
+    # records nothing, so callers can leave profiling off without a second code path.
+    if timer is None:
+        yield None
+        return
+    token = _active.set(timer)
+    profiler = cProfile.Profile() if profile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield timer
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            timer.add_profile(profiler)
+        _active.reset(token)
+
+
+def stage(name):
+    # Times the block into the recording timer, does nothing when no one is recording
+    timer = _active.get()
+    return nullcontext() if timer is None else timer.stage(name)
+
+
+def timed(name):
+    # Decorator form of stage()
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def active():
+    return _active.get()
+
+
+def artist_counts(fig):
+    # What a render has to lay out and draw
+    counts = OrderedDict(artists=len(fig.findobj()))
+    for ax in fig.axes:
+        counts['patches'] = counts.get('patches', 0) + len(ax.patches)
+        counts['images'] = counts.get('images', 0) + len(ax.images)
+        counts['texts'] = counts.get('texts', 0) + len(ax.texts)
+        counts['y_ticks'] = counts.get('y_ticks', 0) + len(ax.get_yticks())
+        legend = ax.get_legend()
+        counts['legend_entries'] = counts.get('legend_entries', 0) + (len(legend.get_texts()) if legend is not None else 0)
+    return counts
+
+
+def show_panel(st, timer, render_profile):
+    # The Profiling expander at the bottom of a Streamlit page: the page's stages, the
+    # renderer's stages and artist counts from render_profile, and downloads of both.
+    # Nothing when render_profile is None (profiling is off).
+    if render_profile is None:
+        return
+    import pandas as pd
+
+    with st.expander("Profiling"):
+        st.write("Page stages")
+        st.dataframe(pd.DataFrame({'ms': [seconds*1000 for seconds in timer.stages.values()]}, index=list(timer.stages)))
+        if render_profile.stages:
+            st.write("Renderer stages")
+            st.dataframe(pd.DataFrame({'ms': [seconds*1000 for seconds in render_profile.stages.values()]}, index=list(render_profile.stages)))
+            st.write("Artists")
+            st.dataframe(pd.DataFrame({'count': list(render_profile.counts.values())}, index=list(render_profile.counts)))
+        else:
+            st.caption("No renderer stages this run, every chart came from the render cache")
+        report = {'page': timer.to_dict(), 'renderer': render_profile.to_dict()}
+        st.download_button("Download timings (JSON)", data=json.dumps(report, indent=2), file_name="profile.json", mime="application/json")
+        if render_profile.profile_bytes() is not None:
+            st.download_button("Download cProfile output", data=render_profile.profile_bytes(), file_name="render.prof", mime="application/octet-stream")
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import matplotlib
+import pandas as pd
+
+import chart
+import export
+import palette
+import profiling
+
+# Modules whose code decides what a chart looks like
+RENDERER_MODULES = (chart, export, palette)
+
+
+def renderer_version():
+    # Hash of the renderer's source and the matplotlib version. Every key includes it,
+    # so a change to either stops charts drawn by the old code from matching.
+    digest = hashlib.sha256(matplotlib.__version__.encode())
+    for module in RENDERER_MODULES:
+        with open(module.__file__, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+RENDER_VERSION = renderer_version()
+
+DEFAULT_CACHE_DIR = ".render_cache"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def hash_dataframe(df):
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(c) for c in df.columns]).encode())
+    digest.update(json.dumps([str(t) for t in df.dtypes]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+# Arguments holding hex colours (for colours, its values), the only text where case
+# makes no difference to the chart
+COLOUR_PARAMS = ('bg_color', 'highlight_color', 'colours')
+
+
+def normalize_params(params):
+    # Stable text form of the styling arguments: sorted keys, lower-case hex colours
+    def normalize(value, colour=False):
+        if isinstance(value, dict):
+            return {str(k): normalize(v, colour) for k, v in sorted(value.items())}
+        if isinstance(value, (list, tuple)):
+            return [normalize(v, colour) for v in value]
+        if colour and isinstance(value, str):
+            return value.lower()
+        if hasattr(value, "item"):
+            return value.item()
+        return value
+
+    return json.dumps({str(k): normalize(v, k in COLOUR_PARAMS) for k, v in params.items()}, sort_keys=True, default=str)
+
+
+class RenderCache:
+    # Content-addressed image store on disk, one file per chart named after its key.
+    # Entries are kept in least recently used order (file mtime doubles as the access
+    # time so the order survives restarts) and the oldest are evicted once the
+    # directory grows past max_bytes.
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+
+        os.makedirs(directory, exist_ok=True)
+        extensions = {"." + export.extension(name) for name in export.FORMATS}
+        found = []
+        for entry in os.scandir(directory):
+            if entry.is_file() and os.path.splitext(entry.name)[1] in extensions:
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._size += size
+
+    def key(self, df, params):
+        # Also the entry's file name: the hash plus the extension of params' format
+        # (export.FORMATS, PNG when params have none)
+        digest = hashlib.sha256()
+        digest.update(str(RENDER_VERSION).encode())
+        digest.update(hash_dataframe(df).encode())
+        digest.update(normalize_params(params).encode())
+        return digest.hexdigest() + "." + export.extension(params.get('format', "PNG"))
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), "rb") as file:
+                    data = file.read()
+                os.utime(self._path(key))
+            except OSError:
+                # Removed behind our back (another process evicted it)
+                self._size -= self._entries.pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            tmp_path = self._path(key) + ".tmp"
+            with open(tmp_path, "wb") as file:
+                file.write(data)
+            os.replace(tmp_path, self._path(key))
+
+            if key in self._entries:
+                self._size -= self._entries.pop(key)
+            self._entries[key] = len(data)
+            self._size += len(data)
+
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._size -= old_size
+                self.evictions += 1
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+
+    def clear(self):
+        with self._lock:
+            for key in self._entries:
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def default_cache():
+    # One cache per process, so every Streamlit session on the server shares it
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = RenderCache()
+        return _default_cache
+
+
+def generate_chart_bytes(df, *args, cache=None, filename=None, session_chart=None, format="PNG", **kwargs):
+    # Drop-in for chart.generate_chart_bytes that skips matplotlib when an identical
+    # chart has been rendered before. Returns the image bytes in one of export.FORMATS
+    # (stored under that format's extension), and also writes them to filename
+    # when one is given. On a miss, a chart.Chart passed as session_chart is updated in
+    # place (only the changed artists) instead of building a new figure.
+    if cache is None:
+        cache = default_cache()
+
+    params = chart.bind_params(*args, **kwargs)
+
+    key = cache.key(df, params if format == "PNG" else dict(params, format=format))
+    data = cache.get(key)
+    if data is None:
+        if format != "PNG":
+            data = export.export_chart(df, *args, format=format, **kwargs)
+        elif session_chart is not None:
+            data = session_chart.update(df, **params).to_bytes()
+        else:
+            data = chart.generate_chart_bytes(df, *args, **kwargs)
+        cache.put(key, data)
+
+    if filename is not None:
+        with open(filename, "wb") as file:
+            file.write(data)
+
+    return data
+
+
+def show_preview(st, key, df, *args, timer, render_profile=None, include_cprofile=False, **kwargs):
+    # The live preview on a Streamlit page: df at chart.preview_scale through a chart.Chart
+    # kept in st.session_state[key] for the whole session, so edits only redraw the
+    # artists they change. Timed as the "preview" stage, with a note under the image
+    # when it missed chart.PREVIEW_TARGET_MS. args and kwargs are the chart arguments.
+    if key not in st.session_state:
+        st.session_state[key] = chart.Chart()
+    params = chart.bind_params(*args, **kwargs)
+    with timer.stage("preview"), profiling.recording(render_profile, include_cprofile):
+        preview_png = generate_chart_bytes(df, **dict(params, scale=chart.preview_scale(params['size'])),
+                                           session_chart=st.session_state[key])
+    st.image(preview_png)
+    preview_ms = timer.stages["preview"]*1000
+    if preview_ms > chart.PREVIEW_TARGET_MS:
+        st.caption(f"Preview took {preview_ms:.0f} ms, over the {chart.PREVIEW_TARGET_MS} ms target")
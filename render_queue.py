@@ -0,0 +1,207 @@
+# Full resolution renders for the Streamlit pages, run by a pool of worker processes
+# instead of on the session's script thread. A page submits a job and polls it; while
+# it waits, the script keeps calling into Streamlit, so a changed setting reruns the page
+# right away and the job for the old settings is cancelled. Every finished chart goes
+# into the render cache, including ones nobody waited for.
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import batch_render
+import profiling
+import render_cache
+import startup
+
+RENDER_WORKERS = os.cpu_count() or 1
+# How often a waiting page checks on its job (and gives Streamlit a chance to rerun it)
+POLL_SECONDS = 0.1
+# Latencies kept for the queue stats
+LATENCY_WINDOW = 100
+
+
+def render_job(df, params, format, profile, cprofile=False, with_png=True):
+    # Runs in a worker process. Returns the PNG (for the page to show) and, for other
+    # formats, the download, plus the renderer's stage timings when profile is set and
+    # its cProfile stats (StageTimer.profile_bytes) when cprofile is set too. Callers
+    # that only want the download pass with_png=False, the PNG is then None unless it
+    # is the download.
+    import export
+
+    started = time.time()
+    timer = profiling.StageTimer() if profile else None
+    with profiling.recording(timer, cprofile):
+        png = batch_render.render_worker_chart(df, params) if with_png or format == "PNG" else None
+        data = png if format == "PNG" else export.export_chart(df, format=format, **params)
+    return {
+        'png': png,
+        'data': data,
+        'started': started,
+        'finished': time.time(),
+        'profile': timer.to_dict() if timer is not None else None,
+        'profile_stats': timer.profile_bytes() if timer is not None else None,
+    }
+
+
+def _warm_up():
+    # Starts the workers and renders a tiny chart in each, so the renderer import, font
+    # cache and glyph caches are paid for before the first real job
+    startup.warm_up(startup.DEFAULT_CONFIG)
+
+
+class RenderJob:
+    # What a page keeps (in st.session_state) for a job it submitted
+
+    def __init__(self, future, key, submitted):
+        self.future = future
+        self.key = key
+        self.submitted = submitted
+        self.superseded = False
+
+    def done(self):
+        return self.future.done()
+
+    def result(self):
+        # The worker's result dict; raises the render's exception if it failed
+        return self.future.result()
+
+    def state(self):
+        if self.future.cancelled() or self.superseded:
+            return "cancelled"
+        if self.future.done():
+            return "failed" if self.future.exception() is not None else "done"
+        return "running" if self.future.running() else "queued"
+
+
+class RenderService:
+    # Bounded pool of render processes shared by every session. Workers are spawned
+    # (batch_render.worker_context) without the page script Streamlit installs as
+    # __main__, so they never run the page or start services of their own. Nothing
+    # is started until the first submit(), or start().
+
+    def __init__(self, workers=RENDER_WORKERS, colours=(), cache=None):
+        self.workers = workers
+        self.cache = cache
+        self.colours = list(colours)
+        self._lock = threading.Lock()
+        # Held while the pool is replaced. Separate from _lock: shutting a pool down runs
+        # the done callbacks of its cancelled jobs, and those take _lock.
+        self._pool_lock = threading.Lock()
+        self._executor = None
+        self._jobs = set()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    def start(self):
+        # Starts the workers, and their warm-up renders, ahead of the first job
+        with self._pool_lock:
+            if self._executor is None:
+                self._start()
+
+    def _start(self):
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=batch_render.worker_context(),
+                                             initializer=batch_render.init_worker, initargs=(self.colours,))
+        for _ in range(self.workers):
+            self._executor.submit(_warm_up)
+
+    def submit(self, df, params, format="PNG", profile=False, cprofile=False, key=None, with_png=True):
+        # key identifies what is being rendered (see render_key); a page compares it
+        # with its current settings to tell whether the job is still wanted. with_png as
+        # for render_job.
+        submitted = time.time()
+        if self._executor is None:
+            self.start()
+        executor = self._executor
+        try:
+            future = executor.submit(render_job, df, params, format, profile, cprofile, with_png)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory), jobs in flight failed with it. The
+            # pool is shared by every session, so start a new one rather than stay broken;
+            # only once when several sessions hit the broken pool together.
+            with self._pool_lock:
+                if self._executor is executor:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self._start()
+            future = self._executor.submit(render_job, df, params, format, profile, cprofile, with_png)
+        job = RenderJob(future, key, submitted)
+        with self._lock:
+            self._jobs.add(job)
+            self.submitted += 1
+        future.add_done_callback(lambda _: self._finished(job, df, params, format))
+        return job
+
+    def cancel(self, job):
+        # A queued job is dropped; one already rendering can't be interrupted, it runs
+        # to the end and its chart only goes into the render cache
+        job.superseded = True
+        job.future.cancel()
+
+    def _finished(self, job, df, params, format):
+        with self._lock:
+            self._jobs.discard(job)
+            try:
+                result = job.future.result()
+            except CancelledError:
+                self.cancelled += 1
+                return
+            except Exception:
+                self.failed += 1
+                return
+            if job.superseded:
+                self.cancelled += 1
+            else:
+                self.completed += 1
+            self._latencies.append((result['started'] - job.submitted, result['finished'] - job.submitted))
+        if self.cache is not None:
+            cache = self.cache
+            if result['png'] is not None:
+                cache.put(cache.key(df, params), result['png'])
+            if format != "PNG":
+                cache.put(cache.key(df, dict(params, format=format)), result['data'])
+
+    def stats(self):
+        with self._lock:
+            # The executor marks a few more jobs than it has workers as running once they
+            # are handed to the worker queue
+            running = min(self.workers, sum(job.future.running() for job in self._jobs))
+            waits = sorted(wait for wait, _ in self._latencies)
+            totals = sorted(total for _, total in self._latencies)
+            return {
+                'workers': self.workers,
+                'queued': len(self._jobs) - running,
+                'running': running,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'cancelled': self.cancelled,
+                'median_wait': waits[len(waits)//2] if waits else None,
+                'median_latency': totals[len(totals)//2] if totals else None,
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def render_key(df, params, format="PNG"):
+    # Same key the render cache files the chart under
+    return render_cache.default_cache().key(df, params if format == "PNG" else dict(params, format=format))
+
+
+_default_service = None
+_default_service_lock = threading.Lock()
+
+
+def default_service(colours=()):
+    # One pool per server process. colours only seed the workers' palettes when the pool
+    # is first started.
+    global _default_service
+    with _default_service_lock:
+        if _default_service is None:
+            _default_service = RenderService(colours=colours, cache=render_cache.default_cache())
+        return _default_service
@@ -0,0 +1,312 @@
+# Headless chart rendering over HTTP, for callers that can't drive the Streamlit app.
+#
+#   python render_server.py --port 8765 --workers 4
+#
+# POST /render with either
+#   - a CSV body (Content-Type: text/csv), styled by query parameters that use the job
+#     spec names of batch_render.py: /render?title=GPU%20Scores&size=1920x1080&sort=score_gpu
+#     (several colours separated by commas: colours=%23f0991a,%23820000)
+#   - a JSON body: {"csv": "...", or "data": [{"heading": ..., "score_x": ...}, ...],
+#                   "spec": {...batch_render job spec...},
+#                   "params": {...chart.generate_chart arguments, override the spec...},
+#                   "format": "SVG"}
+# and get the chart back in the body (PNG unless ?format= or "format" says otherwise).
+# GET /health returns the queue and request counters as JSON.
+#
+# Charts are rendered by a pool of worker processes that are started, and have rendered
+# a throwaway chart, before the first request arrives.
+import argparse
+import asyncio
+import io
+import json
+import math
+import numbers
+import re
+import signal
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+import pandas as pd
+
+import batch_render
+import chart
+import export
+import render_cache
+import render_queue
+import startup
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 16 * 1024 * 1024
+# Renders allowed to wait per worker before new requests get 503
+MAX_PENDING_PER_WORKER = 8
+
+# Spec fields kept as text even when they look like numbers
+TEXT_FIELDS = ('title', 'sub_text', 'sort', 'highlight')
+# generate_chart arguments that have to be numbers
+NUMBER_FIELDS = ('bar_width', 'bar_score_offset', 'title_font_size', 'subtitle_font_size', 'axis_font_size',
+                 'legend_font_size', 'bar_data_font_size', 'x_title_pos', 'y_title_pos')
+SIZE = re.compile(r"[1-9][0-9]*x[1-9][0-9]*")
+HEX_COLOUR = re.compile(r"#[0-9a-fA-F]{6}")
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 411: "Length Required",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def query_value(value):
+    # Query strings only carry text; numbers and true/false are read back as such
+    if value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return value
+
+
+def parse_request(content_type, query, body):
+    # The DataFrame, job spec, generate_chart overrides and format of one render request
+    if content_type.startswith("application/json"):
+        try:
+            request = json.loads(body)
+        except ValueError as error:
+            raise RequestError(400, f"invalid JSON: {error}")
+        if "csv" in request:
+            df = pd.read_csv(io.StringIO(request["csv"]))
+        elif "data" in request:
+            df = pd.DataFrame(request["data"])
+        else:
+            raise RequestError(400, 'JSON body needs "csv" or "data"')
+        spec = request.get("spec", {})
+        params = request.get("params", {})
+        format = request.get("format", query.pop("format", "PNG"))
+    else:
+        df = pd.read_csv(io.BytesIO(body))
+        format = query.pop("format", "PNG")
+        spec = {name: value if name in TEXT_FIELDS else query_value(value) for name, value in query.items()}
+        params = {}
+
+    if format not in export.FORMATS:
+        raise RequestError(400, f"unknown format {format!r}, use one of {list(export.FORMATS)}")
+    if 'heading' not in df.columns or not any(column.startswith("score_") for column in df.columns):
+        raise RequestError(400, f"data needs a heading column and score_* columns, got {list(df.columns)}")
+    text = [column for column in df.columns if column.startswith("score_") and not pd.api.types.is_numeric_dtype(df[column])]
+    if text:
+        raise RequestError(400, f"score columns must be numbers: {text}")
+    return df, spec, params, format
+
+
+def check_size(size):
+    if not isinstance(size, str) or not SIZE.fullmatch(size):
+        raise ValueError(f"size must be WIDTHxHEIGHT, e.g. 1920x1080, got {size!r}")
+
+
+def check_colour(name, colour):
+    if not isinstance(colour, str) or not HEX_COLOUR.fullmatch(colour):
+        raise ValueError(f"{name} must be a hex colour like #f0991a, got {colour!r}")
+
+
+def check_spec(spec):
+    # Before chart_args reads the spec. Returns it with colours as a list; a single
+    # string is one colour or several separated by commas.
+    if 'size' in spec:
+        check_size(spec['size'])
+    colours = spec.get('colours')
+    if isinstance(colours, str):
+        spec = dict(spec, colours=colours.split(","))
+    elif colours is not None and not isinstance(colours, list):
+        raise ValueError(f"colours must be a hex colour or a list of them, got {colours!r}")
+    for colour in spec.get('colours', []):
+        check_colour('colours', colour)
+    if colours is not None and not spec['colours']:
+        raise ValueError("colours is empty")
+    if not isinstance(spec.get('legend', {}), dict):
+        raise ValueError(f"legend must map score columns to legend text, got {spec['legend']!r}")
+    return spec
+
+
+def check_params(params):
+    # The generate_chart arguments after the overrides, for what the worker would
+    # only trip over
+    check_size(params['size'])
+    if not isinstance(params['colours'], dict):
+        raise ValueError(f"colours must map col names to hex colours, got {params['colours']!r}")
+    for colour in params['colours'].values():
+        check_colour('colours', colour)
+    check_colour('bg_color', params['bg_color'])
+    check_colour('highlight_color', params['highlight_color'])
+    for name in ('title', 'sub_text', 'highlight'):
+        if not isinstance(params[name], str):
+            raise ValueError(f"{name} must be text, got {params[name]!r}")
+    for name in NUMBER_FIELDS:
+        value = params[name]
+        if isinstance(value, bool) or not isinstance(value, numbers.Real) or not math.isfinite(value):
+            raise ValueError(f"{name} must be a number, got {value!r}")
+
+
+class RenderServer:
+
+    def __init__(self, config, workers=render_queue.RENDER_WORKERS, cache=None):
+        self.config = config
+        self.cache = cache
+        self.service = render_queue.RenderService(workers=workers, colours=config['default_colours'], cache=cache)
+        self.service.start()
+        self.max_pending = workers * MAX_PENDING_PER_WORKER
+        self.pending = 0
+        self.requests = 0
+        self.errors = 0
+
+    async def render(self, content_type, query, body):
+        # Parsing and argument building run off the event loop, they can take a while
+        # for big files
+        df, params, format = await asyncio.to_thread(self._prepare, content_type, query, body)
+
+        if self.cache is not None:
+            data = self.cache.get(self.cache.key(df, params if format == "PNG" else dict(params, format=format)))
+            if data is not None:
+                return data, format
+
+        if self.pending >= self.max_pending:
+            raise RequestError(503, "render queue is full, retry later")
+        self.pending += 1
+        try:
+            # Only the requested format is sent back, no PNG to show alongside it
+            job = self.service.submit(df, params, format, with_png=False)
+            result = await asyncio.wrap_future(job.future)
+        finally:
+            self.pending -= 1
+        return result['data'], format
+
+    def _prepare(self, content_type, query, body):
+        try:
+            df, spec, overrides, format = parse_request(content_type, query, body)
+            # Checked here, not in the worker: an unknown argument would also stay in the
+            # worker's reused Chart and break its later jobs
+            params = chart.bind_params(**dict(batch_render.chart_args(df, check_spec(spec), self.config), **overrides))
+            check_params(params)
+        except (ValueError, KeyError, TypeError, pd.errors.ParserError) as error:
+            # Malformed CSV, unknown sort column, spec values of the wrong type or form,
+            # unknown generate_chart arguments
+            raise RequestError(400, str(error))
+        return df, params, format
+
+    def health(self):
+        return dict(self.service.stats(), requests=self.requests, errors=self.errors, pending=self.pending)
+
+    async def dispatch(self, method, target, headers, body):
+        url = urlsplit(target)
+        if url.path == "/health":
+            if method != "GET":
+                raise RequestError(405, "use GET")
+            return "application/json", json.dumps(self.health()).encode()
+        if url.path == "/render":
+            if method != "POST":
+                raise RequestError(405, "use POST")
+            data, format = await self.render(headers.get("content-type", "text/csv"), dict(parse_qsl(url.query)), body)
+            return export.mime_type(format), data
+        raise RequestError(404, f"no such endpoint {url.path}")
+
+    async def handle(self, reader, writer):
+        # One connection, kept alive for as many HTTP/1.1 requests as the client sends
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                start = time.perf_counter()
+                self.requests += 1
+                try:
+                    # Bodies that are refused are not read, so the connection can't be reused
+                    if "transfer-encoding" in headers:
+                        keep_alive = False
+                        raise RequestError(411, "send a Content-Length, chunked bodies are not supported")
+                    length = int(headers.get("content-length", 0))
+                    if length > MAX_BODY_BYTES:
+                        keep_alive = False
+                        raise RequestError(413, f"body over {MAX_BODY_BYTES} bytes")
+                    body = await reader.readexactly(length) if length else b""
+                    status = 200
+                    content_type, payload = await self.dispatch(method, target, headers, body)
+                except RequestError as error:
+                    self.errors += 1
+                    status, content_type, payload = error.status, "application/json", json.dumps({'error': str(error)}).encode()
+                except Exception as error:
+                    # A render that failed in the worker
+                    self.errors += 1
+                    status, content_type, payload = 500, "application/json", json.dumps({'error': str(error)}).encode()
+
+                head = [
+                    f"HTTP/1.1 {status} {REASONS[status]}",
+                    f"Content-Type: {content_type}",
+                    f"Content-Length: {len(payload)}",
+                    f"X-Render-Seconds: {time.perf_counter() - start:.4f}",
+                    "Connection: " + ("keep-alive" if keep_alive else "close"),
+                ]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            # Client went away mid-request, or sent something that isn't HTTP
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Rendering on http://{host}:{port} with {self.service.workers} workers")
+        # Stopped by Ctrl+C or SIGTERM, either way the render workers are shut down with
+        # it instead of being left running
+        stop = asyncio.Event()
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+        except NotImplementedError:
+            # Windows has no loop signal handlers, only Ctrl+C stops the server there
+            pass
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            self.service.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve chart renders over HTTP.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=render_queue.RENDER_WORKERS,
+                        help="render processes (default: one per core)")
+    parser.add_argument("--config", default=batch_render.config_file_path,
+                        help="presets for anything a request leaves out (default: config.yaml)")
+    parser.add_argument("--no-cache", action="store_true", help="render every request, even repeats")
+    args = parser.parse_args(argv)
+
+    config = startup.load_config(args.config) or startup.DEFAULT_CONFIG
+    cache = None if args.no_cache else render_cache.default_cache()
+    server = RenderServer(config, workers=args.workers, cache=cache)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pyarrow as pa
+import pandas as pd
+import pyarrow.feather as feather
+
+import frameview_data
+
+
+def store_version():
+    # Hash of frameview_data's source and the pandas version, which between them decide
+    # the parsed frames and summaries. A change to either stops old runs from matching.
+    digest = hashlib.sha256(pd.__version__.encode())
+    with open(frameview_data.__file__, "rb") as file:
+        digest.update(file.read())
+    return digest.hexdigest()
+
+
+STORE_VERSION = store_version()
+
+DEFAULT_STORE_DIR = ".run_store"
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+
+class RunStore:
+    # Parsed FrameView runs on disk, keyed by the content digest of the uploaded CSV.
+    # Each run is an uncompressed Feather (Arrow IPC) file of its parsed frame, one of
+    # its summary, and a small JSON file the listing reads. Loads memory-map the Arrow
+    # files, so the numeric columns are used in place instead of being parsed or copied.
+    # Runs are evicted oldest first once the store grows past max_bytes.
+
+    def __init__(self, directory=DEFAULT_STORE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, part):
+        return os.path.join(self.directory, key + "." + part)
+
+    def _read_meta(self, key):
+        try:
+            with open(self._path(key, "json"), "r") as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get('version') == STORE_VERSION else None
+
+    def get(self, key):
+        # {'name', 'df', 'summary'} of a stored run, or None. df is None for runs that
+        # were streamed. summary is indexed by Resolution only, callers add the run.
+        meta = self._read_meta(key)
+        if meta is None:
+            return None
+        try:
+            summary = _read(self._path(key, "summary.feather")).set_index('Resolution')
+            df = _read(self._path(key, "frame.feather")) if meta['rows'] is not None else None
+        except (OSError, pa.ArrowInvalid):
+            # Half written or removed behind our back (another process evicted it)
+            return None
+        return {'name': meta['name'], 'df': df, 'summary': summary}
+
+    def put(self, key, name, df, summary):
+        # summary as frameview_data builds it for a single run; df may be None
+        with self._lock:
+            size = _write(summary.reset_index(level='run', drop=True).reset_index(), self._path(key, "summary.feather"))
+            if df is not None:
+                size += _write(df, self._path(key, "frame.feather"))
+            meta = {
+                'version': STORE_VERSION,
+                'key': key,
+                'name': name,
+                'rows': None if df is None else len(df),
+                'resolutions': sorted(summary.index.get_level_values('Resolution').unique()),
+                'bytes': size,
+                'stored': time.time(),
+            }
+            # Written last: a run is only listed once its Arrow files are complete
+            tmp_path = self._path(key, "json.tmp")
+            with open(tmp_path, "w") as file:
+                json.dump(meta, file)
+            os.replace(tmp_path, self._path(key, "json"))
+            self._evict()
+
+    def runs(self):
+        # Metadata of every stored run, newest first
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                meta = self._read_meta(entry.name[:-5])
+                if meta is not None:
+                    found.append(meta)
+        return sorted(found, key=lambda meta: meta['stored'], reverse=True)
+
+    def remove(self, key):
+        for part in ("json", "summary.feather", "frame.feather"):
+            try:
+                os.remove(self._path(key, part))
+            except OSError:
+                pass
+
+    def _evict(self):
+        runs = self.runs()
+        size = sum(meta['bytes'] for meta in runs)
+        while size > self.max_bytes and len(runs) > 1:
+            old = runs.pop()
+            size -= old['bytes']
+            self.remove(old['key'])
+
+
+def _write(df, path):
+    # Uncompressed so the file can be memory-mapped and used without decoding
+    tmp_path = path + ".tmp"
+    feather.write_feather(df, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+def _read(path):
+    # split_blocks keeps each column its own block, so null-free numeric columns stay
+    # views of the mapped file instead of being consolidated into new arrays
+    return feather.read_table(path, memory_map=True).to_pandas(split_blocks=True)
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def default_store():
+    # One store per process, shared by every Streamlit session on the server
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = RunStore()
+        return _default_store
@@ -0,0 +1,113 @@
+# Cold-start helpers for the entry points (the Streamlit pages, render_server.py,
+# batch_render.py). Only the standard library and yaml are imported here, so a page can
+# draw its uploader before pandas and matplotlib are loaded and have them loaded in the
+# background while the user picks a file.
+#
+#   python startup.py    builds matplotlib's font cache and the renderer's caches ahead
+#                        of the first launch, and prints how long that took
+import gc
+import importlib
+import os
+import threading
+import time
+
+import yaml
+
+# Small enough that the warm-up render costs next to nothing
+WARM_UP_SIZE = "320x240"
+# Everything the pages import once there is data to chart
+WARM_UP_MODULES = ("pandas", "chart", "export", "frameview_data", "frameview_export", "large_data",
+                   "render_cache", "render_queue", "text_fit", "upload_cache")
+
+# The presets used when there is no config.yaml, the same as the one shipped. The pages
+# write it out on first launch. default_colours are the series colours, then the
+# background (index 4) and highlight (index 5) colours.
+DEFAULT_CONFIG = {
+    'resolutions': ['3840x2160', '1920x1080', '1300x1300'],
+    'default_colours': ['#f0991a', '#820000', '#32f01a', '#af1af0', '#070d0d', '#016795'],
+    'title_presets': ['CPU Scores', 'GPU Scores'],
+    'sub_title_presets': ['Higher scores indicate higher performance', 'Lower scores indicate higher performance']
+    }
+
+_configs = {}
+_configs_lock = threading.Lock()
+_warm_up_thread = None
+_warm_up_lock = threading.Lock()
+
+
+def use_agg():
+    # Nothing here ever opens a window. Must run before matplotlib is first imported, so
+    # pyplot never probes for Tk/Qt/GTK.
+    os.environ.setdefault("MPLBACKEND", "Agg")
+
+
+def load_config(file_path):
+    # Parsed once per process and shared by every session and rerun; read again only
+    # when the file's modification time changes. None when there is no file (callers
+    # fall back to DEFAULT_CONFIG). Treat the result as read-only.
+    try:
+        mtime = os.stat(file_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _configs_lock:
+        cached = _configs.get(file_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    with open(file_path, 'r') as file:
+        config = yaml.safe_load(file)
+    with _configs_lock:
+        _configs[file_path] = (mtime, config)
+    return config
+
+
+def save_config(config, file_path):
+    with open(file_path, 'w') as file:
+        yaml.dump(config, file, default_flow_style=False)
+    with _configs_lock:
+        _configs[file_path] = (os.stat(file_path).st_mtime_ns, config)
+
+
+def warm_up(config):
+    # Pays the cold costs in this process: importing the renderer and the pages' modules,
+    # matplotlib's font cache, the gradient tables of the configured colours, the label
+    # measuring font and one tiny render for the glyph caches and the Agg canvas.
+    # Everything loaded by then stays for the life of the process, so it is then moved
+    # out of the garbage collector's sight: otherwise the first full collection during
+    # a render walks every object streamlit, pandas and matplotlib made, which added
+    # 70-90 ms to the page's first preview.
+    for module in WARM_UP_MODULES:
+        importlib.import_module(module)
+    import pandas as pd
+
+    import batch_render
+    import chart
+    import palette
+
+    palette.seed_from_config(config)
+    df = pd.DataFrame({'heading': ["warm up"], 'score_warm_up': [1]})
+    chart.generate_chart_bytes(df, **batch_render.chart_args(df, {'size': WARM_UP_SIZE}, config))
+    gc.collect()
+    gc.freeze()
+
+
+def warm_up_in_background(config):
+    # warm_up() on a daemon thread, once per process whoever calls it first. Imports on
+    # the page's own thread wait for the thread's imports to finish rather than doing
+    # them twice.
+    global _warm_up_thread
+    with _warm_up_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=warm_up, args=(config,), name="warm-up", daemon=True)
+            _warm_up_thread.start()
+        return _warm_up_thread
+
+
+if __name__ == "__main__":
+    use_agg()
+    start = time.perf_counter()
+    import matplotlib.font_manager
+    print(f"font cache {(time.perf_counter() - start)*1000:.0f} ms ({matplotlib.get_cachedir()})")
+    start = time.perf_counter()
+    import batch_render
+    warm_up(load_config(batch_render.config_file_path) or DEFAULT_CONFIG)
+    print(f"renderer warm-up {(time.perf_counter() - start)*1000:.0f} ms")
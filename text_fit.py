@@ -0,0 +1,72 @@
+# Axis font size picked from the real rendered size of the y tick labels instead of
+# character counts and trial renders. Each line of text is measured once per font at
+# a reference size and memoized; glyph advances scale linearly with the font size, so
+# any other size is a multiplication.
+import functools
+import math
+
+import matplotlib
+import numpy as np
+import pandas as pd
+from matplotlib.font_manager import FontProperties, findfont
+from matplotlib.textpath import TextToPath
+
+import chart
+
+REFERENCE_SIZE = 100
+# Same range as the Axis Font Size slider
+MIN_SIZE = 5
+MAX_SIZE = 30
+# matplotlib's default Text linespacing, as a multiple of the font size
+LINE_SPACING = 1.2
+# Only this many of the longest lines (by character count) are measured, the widest
+# label is practically always among them and huge files stay cheap to fit
+CANDIDATES = 50
+
+_text_to_path = TextToPath()
+
+
+@functools.lru_cache(maxsize=None)
+def default_font():
+    # File of the font tick labels are drawn with
+    return findfont(FontProperties())
+
+
+@functools.lru_cache(maxsize=65536)
+def text_width(text, size, font):
+    # Width in points of one line of text at size, in the font file font
+    width, _, _ = _text_to_path.get_text_width_height_descent(text, FontProperties(fname=font, size=size), ismath=False)
+    return width
+
+
+def label_lines(df, candidates=CANDIDATES):
+    # The longest distinct lines of the y tick labels, as chart.py builds them
+    lines = df['heading'].astype(str)
+    if 'subheading' in df:
+        lines = pd.concat([lines, df['subheading'].astype(str)], ignore_index=True)
+    lines = lines.drop_duplicates()
+    if len(lines) > candidates:
+        lines = lines.iloc[np.argpartition(-lines.str.len().to_numpy(), candidates)[:candidates]]
+    return list(lines)
+
+
+def axis_font_size(df, size, rows=None):
+    # Largest axis_font_size (before the 4K doubling) at which the widest label fits
+    # left of the axes and each label fits its row. rows is how many rows one chart
+    # shows, all of df by default.
+    rc = matplotlib.rcParams
+    width, height = (int(pixels) / rc['figure.dpi'] * 72 for pixels in size.split("x"))
+    if rows is None:
+        rows = len(df)
+
+    font = default_font()
+    widest = max((text_width(line, REFERENCE_SIZE, font) for line in label_lines(df)), default=0) / REFERENCE_SIZE
+    available_width = rc['figure.subplot.left'] * width - rc['ytick.major.size'] - rc['ytick.major.pad']
+    lines = 2 if 'subheading' in df else 1
+    row_height = (rc['figure.subplot.top'] - rc['figure.subplot.bottom']) * height / max(rows, 1)
+
+    fitted = row_height / (lines * LINE_SPACING)
+    if widest > 0:
+        fitted = min(fitted, available_width / widest)
+    fitted /= chart.font_scale(size)
+    return min(MAX_SIZE, max(MIN_SIZE, math.floor(fitted)))
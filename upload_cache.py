@@ -0,0 +1,191 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+import frameview_data
+
+# Parsed uploads are shared between reruns and sessions, so callers must treat the
+# returned DataFrames as read-only (every page already works on copies: sort_values,
+# drop, boolean filtering). Frames and FrameView summaries are cached separately, each
+# file takes one entry in each, so this many files stay cached.
+MAX_ENTRIES = 64
+TTL_SECONDS = 30 * 60
+# Threads rather than processes: the CSV tokenizer and the groupby release the GIL, and
+# uploads and parsed frames don't have to be pickled across
+INGEST_WORKERS = os.cpu_count() or 1
+
+
+class TTLCache:
+    # Bounded in-memory cache: least recently used entries go first once max_entries
+    # is reached, and anything older than ttl seconds is treated as missing.
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            self._expire()
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _expire(self):
+        now = time.monotonic()
+        for key in [key for key, (stored, _) in self._entries.items() if now - stored > self.ttl]:
+            del self._entries[key]
+
+    def get_or_compute(self, key, compute):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+parsed = TTLCache()
+summaries = TTLCache()
+aggregates = TTLCache()
+
+
+def digest(uploaded_file):
+    # Remembered on the upload object so a file is hashed once per script run
+    value = getattr(uploaded_file, "_content_digest", None)
+    if value is None:
+        value = hashlib.blake2b(uploaded_file.getvalue(), digest_size=20).hexdigest()
+        try:
+            uploaded_file._content_digest = value
+        except AttributeError:
+            pass
+    return value
+
+
+def read_csv(uploaded_file):
+    return parsed.get_or_compute(("csv", digest(uploaded_file)),
+                                 lambda: pd.read_csv(io.BytesIO(uploaded_file.getvalue())))
+
+
+def read_frameview(uploaded_file):
+    return parsed.get_or_compute(("frameview", digest(uploaded_file)),
+                                 lambda: frameview_data.read_frameview(io.BytesIO(uploaded_file.getvalue())))
+
+
+def stream_summary(uploaded_file, run):
+    return summaries.get_or_compute(("frameview_stream", digest(uploaded_file), run),
+                                    lambda: frameview_data.stream_summary(io.BytesIO(uploaded_file.getvalue()), run))
+
+
+def summarize_frameview(uploaded_file, df, run):
+    # Totals for one whole run, the common case of no excluded rows
+    return summaries.get_or_compute(("frameview_summary", digest(uploaded_file), run),
+                                    lambda: frameview_data.summarize_runs([df], [run]))
+
+
+def _stored_result(key, run, store):
+    # A run from the on-disk store in the form _ingest_frameview returns, or None
+    stored = store.get(key)
+    if stored is None:
+        return None
+    return {'name': stored['name'], 'df': stored['df'], 'stored': True,
+            'summary': pd.concat({run: stored['summary']}, names=['run'])}
+
+
+def _ingest_frameview(uploaded_file, run, large_bytes, store=None):
+    start = time.perf_counter()
+    result = {'name': uploaded_file.name, 'run': run, 'digest': digest(uploaded_file),
+              'df': None, 'summary': None, 'error': None, 'stored': False}
+    try:
+        stored = _stored_result(result['digest'], run, store) if store is not None else None
+        if stored is not None:
+            # Named as uploaded this time, which may differ from when it was stored
+            result.update(stored, name=uploaded_file.name)
+        else:
+            if uploaded_file.size > large_bytes:
+                result['summary'] = stream_summary(uploaded_file, run)
+            else:
+                result['df'] = read_frameview(uploaded_file)
+                result['summary'] = summarize_frameview(uploaded_file, result['df'], run)
+            if store is not None:
+                try:
+                    store.put(result['digest'], uploaded_file.name, result['df'], result['summary'])
+                except OSError:
+                    # A full or read-only disk only costs the next session a re-parse
+                    pass
+    except ValueError as error:
+        # Missing FrameView columns, non-numeric metrics, empty or malformed CSV
+        result['error'] = str(error)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def ingest_frameview(uploaded_files, large_bytes, workers=None, progress=None, store=None):
+    # Reads, checks and summarizes every upload on a bounded thread pool. Uploads over
+    # large_bytes are streamed and come back with a summary but no df. Results are in
+    # upload order; a file that could not be read has its error set instead.
+    # progress(done, total, result) runs on the calling thread as each file finishes,
+    # since Streamlit elements can only be updated from the script thread.
+    # With a run_store.RunStore, files already in it are loaded from there instead of
+    # being parsed, and new ones are added to it.
+    if not uploaded_files:
+        return []
+    if workers is None:
+        workers = min(INGEST_WORKERS, len(uploaded_files))
+
+    results = [None] * len(uploaded_files)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_ingest_frameview, uploaded_file, run, large_bytes, store): run
+                   for run, uploaded_file in enumerate(uploaded_files)}
+        for done, future in enumerate(as_completed(futures), 1):
+            results[futures[future]] = future.result()
+            if progress is not None:
+                progress(done, len(uploaded_files), results[futures[future]])
+    return results
+
+
+def load_stored(keys, store, first_run=0):
+    # Runs picked from the store without uploading them, numbered on from first_run,
+    # in the same form as ingest_frameview's results
+    results = []
+    for run, key in enumerate(keys, first_run):
+        start = time.perf_counter()
+        result = {'name': key, 'run': run, 'digest': key, 'df': None, 'summary': None, 'error': None, 'stored': True}
+        stored = _stored_result(key, run, store)
+        if stored is None:
+            result['error'] = "no longer in the run store"
+        else:
+            result.update(stored)
+        result['seconds'] = time.perf_counter() - start
+        results.append(result)
+    return results
+
+
+def aggregate(key, compute):
+    # key should cover everything compute depends on, e.g. file digests plus excluded rows
+    return aggregates.get_or_compute(key, compute)